@@ -0,0 +1,94 @@
+import asyncio
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+from telebot.async_telebot import AsyncTeleBot
+
+from webhook import update_chat_id
+
+
+class AsyncEngine:
+    """Приём апдейтов через AsyncTeleBot и конкурентная обработка по чатам.
+
+    Хендлеры остаются прежними (синхронный `bot`), но выполняются в пуле
+    потоков: апдейты разных чатов идут параллельно, апдейты одного чата —
+    строго друг за другом, поэтому шаги многошаговых диалогов не
+    ломаются. Общее число выполняющихся хендлеров ограничено `max_in_flight`,
+    а при слишком длинной очереди приём новых апдейтов приостанавливается.
+    """
+
+    def __init__(self, bot, token, max_in_flight=100, max_pending=1000, poll_timeout=20):
+        self.bot = bot
+        self.abot = AsyncTeleBot(token)
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending
+        self.poll_timeout = poll_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="handler")
+        self._tails = {}
+        self._pending = 0
+        self._stopping = False
+        # Порядок внутри чата держим сами, поэтому хендлеры вызываются синхронно.
+        bot.threaded = False
+
+    async def dispatch(self, update):
+        chat_id = update_chat_id(update)
+        prev = self._tails.get(chat_id)
+        task = asyncio.create_task(self._run_after(prev, update))
+        self._tails[chat_id] = task
+        self._pending += 1
+        task.add_done_callback(lambda t: self._done(chat_id, t))
+
+    def backlog(self):
+        return self._pending
+
+    def _done(self, chat_id, task):
+        self._pending -= 1
+        if self._tails.get(chat_id) is task:
+            del self._tails[chat_id]
+
+    async def _run_after(self, prev, update):
+        if prev is not None:
+            await asyncio.wait([prev])
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(self.executor, self.bot.process_new_updates, [update])
+            except Exception as e:
+                print(f"update {update.update_id} failed: {e!r}")
+
+    async def _poll(self):
+        offset = None
+        while not self._stopping:
+            while self._pending >= self.max_pending:
+                await asyncio.sleep(0.05)
+            try:
+                updates = await self.abot.get_updates(offset=offset, timeout=self.poll_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"get_updates failed: {e!r}")
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                offset = update.update_id + 1
+                await self.dispatch(update)
+
+    async def run(self):
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        loop = asyncio.get_running_loop()
+        poller = asyncio.create_task(self._poll())
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, poller.cancel)
+        try:
+            await poller
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._stopping = True
+            if self._tails:
+                await asyncio.wait(list(self._tails.values()))
+            try:
+                await self.abot.close_session()
+            except AttributeError:
+                pass  # сессия aiohttp так и не была открыта
+            self.executor.shutdown(wait=True)
@@ -0,0 +1,274 @@
+"""Офлайн-бенчмарк бота: настоящие хендлеры tg_bot против заглушки Bot API.
+
+    python bench.py --db users=1000,speakers=20,events=50,questions=2000 --out bench.json
+
+На каждую пару (бэкенд хранилища, размер базы) запускается отдельный процесс:
+tg_bot читает настройки при импорте. Результат — JSON: p50/p99 хендлеров,
+пропускная способность notify_all, стоимость загрузки, снапшота и записи.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from telebot import apihelper, types
+
+from fakeapi import FakeBotApi
+from storage import JsonStorage, SqliteStorage, migrate_json_to_sqlite, open_storage
+from webhook import fake_update
+
+
+DEFAULT_DBS = [
+    "users=1000,speakers=20,events=50,questions=2000",
+    "users=20000,speakers=200,events=500,questions=40000",
+]
+
+ADMIN = 1
+
+
+def parse_spec(spec):
+    sizes = {"users": 0, "speakers": 0, "events": 0, "questions": 0}
+    for part in spec.split(","):
+        key, _, value = part.partition("=")
+        if key.strip() not in sizes:
+            raise ValueError(f"неизвестный параметр базы: {key}")
+        sizes[key.strip()] = int(value)
+    sizes["users"] = max(sizes["users"], sizes["speakers"] + 2)
+    return sizes
+
+
+def percentiles(samples):
+    xs = sorted(samples)
+    if not xs:
+        return {"n": 0}
+    at = lambda q: xs[min(len(xs) - 1, int(q * len(xs)))] * 1000
+    return {"n": len(xs), "p50_ms": round(at(0.5), 3), "p99_ms": round(at(0.99), 3), "max_ms": round(xs[-1] * 1000, 3)}
+
+
+# --------------------- SYNTHETIC DB ---------------------
+
+def speaker_ids(sizes):
+    return [str(uid) for uid in range(2, sizes["speakers"] + 2)]
+
+
+def user_ids(sizes):
+    return [str(uid) for uid in range(sizes["speakers"] + 2, sizes["users"] + 1)]
+
+
+def synthetic_db(sizes, rnd):
+    """Снапшот в формате JsonStorage: admin = 1, затем спикеры, затем слушатели."""
+    speakers, users = speaker_ids(sizes), user_ids(sizes)
+    now = int(time.time())
+    roles = {str(ADMIN): "admin", **{uid: "speaker" for uid in speakers}, **{uid: "user" for uid in users}}
+    events = [{
+        "id": i,
+        "title": f"Доклад #{i}: про производительность",
+        "description": "Описание мероприятия. " * rnd.randint(3, 12),
+        "speaker_id": sid,
+        "speaker_name": f"Speaker {sid}",
+        "created_at": now - i,
+    } for i, sid in ((i, rnd.choice(speakers)) for i in range(1, sizes["events"] + 1))]
+    questions = {}
+    for i in range(1, sizes["questions"] + 1):
+        answered = rnd.random() < 0.5
+        questions[str(i)] = {
+            "id": i,
+            "from": int(rnd.choice(users)),
+            "to": int(rnd.choice(speakers)),
+            "question": f"Вопрос {i}: как это масштабируется?",
+            "answer": f"Ответ на вопрос {i}." if answered else None,
+            "created_at": now - i,
+            "answered_at": now if answered else None,
+        }
+    return {
+        "roles": roles,
+        "speakers": {uid: f"Speaker {uid}" for uid in speakers},
+        "events": events,
+        "questions": questions,
+        "password_attempts": {},
+        "next_ids": {"events": sizes["events"] + 1, "questions": sizes["questions"] + 1},
+    }
+
+
+def build_db(backend, db_path, sqlite_path, data):
+    with open(db_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    if backend == "sqlite":
+        source = JsonStorage(db_path)
+        target = SqliteStorage(sqlite_path)
+        migrate_json_to_sqlite(source, target)
+        source.close()
+        target.close()
+
+
+# --------------------- MEASUREMENTS ---------------------
+
+def measure_storage(backend, db_path, sqlite_path, writes):
+    start = time.perf_counter()
+    store = open_storage(backend, db_path, sqlite_path, flush_mode="immediate")
+    load = time.perf_counter() - start
+    samples = []
+    for i in range(writes):
+        start = time.perf_counter()
+        store.set_attempts(str(100_000 + i), {"tries": 1})
+        store.flush()
+        samples.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    if backend == "json":
+        store.journal.compact()
+    else:
+        with store.lock:
+            store.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    save = time.perf_counter() - start
+    store.close()
+    return {
+        "db_bytes": os.path.getsize(db_path if backend == "json" else sqlite_path),
+        "load_s": round(load, 4),
+        "save_s": round(save, 4),
+        "write": percentiles(samples),
+    }
+
+
+def entry_points(sizes):
+    """Имя -> (кто, как): сообщение текстом или нажатие кнопки."""
+    last_user = user_ids(sizes)[min(9, len(user_ids(sizes)) - 1)]
+    return {
+        "/start": ("user", "text", "/start"),
+        "events": ("user", "text", "📅 Посмотреть мероприятия"),
+        "ask_speaker": ("user", "text", "❓ Задать вопрос спикеру"),
+        "my_answers": ("user", "text", "📨 Мои ответы"),
+        "my_questions": ("speaker", "text", "📨 Мои вопросы"),
+        "schedule": ("user", "text", "⏭ Расписание"),
+        "admin_panel": ("admin", "text", "🔧 Админ-панель"),
+        "admin_users": ("admin", "callback", "admin_users"),
+        "admin_users_next": ("admin", "callback", f"pg_users_a_{last_user}"),
+        "admin_events": ("admin", "callback", "admin_events"),
+        "admin_questions": ("admin", "callback", "admin_questions"),
+    }
+
+
+def measure_handlers(bot, sizes, iterations, rnd):
+    who = {"user": user_ids(sizes), "speaker": speaker_ids(sizes), "admin": [str(ADMIN)]}
+    results = {}
+    for name, (role, kind, payload) in entry_points(sizes).items():
+        samples, errors = [], 0
+        for _ in range(iterations):
+            uid = int(rnd.choice(who[role]))
+            raw = fake_update(uid, text=payload) if kind == "text" else fake_update(uid, callback_data=payload)
+            update = types.Update.de_json(raw)
+            start = time.perf_counter()
+            try:
+                bot.process_new_updates([update])
+            except Exception:
+                errors += 1
+            samples.append(time.perf_counter() - start)
+        results[name] = dict(percentiles(samples), errors=errors)
+    return results
+
+
+def measure_notify(tg_bot, api, timeout):
+    before = api.stats()
+    start = time.perf_counter()
+    job = tg_bot.notify_all("Бенчмарк рассылки")
+    finished = job.done.wait(timeout)
+    elapsed = time.perf_counter() - start
+    after = api.stats()
+    return {
+        "recipients": job.total,
+        "finished": finished,
+        "elapsed_s": round(elapsed, 3),
+        "messages_per_s": round(job.sent / elapsed, 1) if elapsed else None,
+        "sent": job.sent,
+        "failed": job.failed + job.blocked,
+        "throttled": after["throttled"] - before["throttled"],
+    }
+
+
+# --------------------- RUN ---------------------
+
+def run_worker(args):
+    sizes = parse_spec(args.db[-1])
+    rnd = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="tgbench-")
+    db_path = os.path.join(workdir, "db.json")
+    sqlite_path = os.path.join(workdir, "db.sqlite3")
+    build_db(args.backend, db_path, sqlite_path, synthetic_db(sizes, rnd))
+    storage = measure_storage(args.backend, db_path, sqlite_path, args.writes)
+
+    api = FakeBotApi(latency=args.latency_ms / 1000, error_rate=args.error_rate,
+                     retry_after=args.retry_after, seed=args.seed).start()
+    apihelper.API_URL = api.api_url
+    os.environ.update({
+        "TOKEN": "1:bench", "ADMIN_ID": str(ADMIN), "SPEAKER_PASSWORD": "bench",
+        "DB_PATH": db_path, "SQLITE_PATH": sqlite_path, "STORAGE_BACKEND": args.backend,
+        "DB_FLUSH_MODE": args.flush_mode, "BROADCAST_RATE": str(args.broadcast_rate),
+        "NAME_CACHE_PATH": os.path.join(workdir, "names.json"),
+    })
+    import tg_bot
+    tg_bot.bot.threaded = False
+    try:
+        handlers = measure_handlers(tg_bot.bot, sizes, args.iterations, rnd)
+        notify = measure_notify(tg_bot, api, args.notify_timeout)
+    finally:
+        tg_bot.broadcaster.shutdown()
+        tg_bot.store.close()
+        api.stop()
+    return {"backend": args.backend, "db": sizes, "storage": storage, "handlers": handlers,
+            "notify_all": notify, "api": api.stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", action="append", help="размер базы: users=N,speakers=N,events=N,questions=N (можно несколько)")
+    parser.add_argument("--backends", nargs="+", default=["json", "sqlite"], choices=["json", "sqlite"])
+    parser.add_argument("--iterations", type=int, default=200, help="вызовов на каждый хендлер")
+    parser.add_argument("--writes", type=int, default=200, help="одиночных записей для замера стоимости записи")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="задержка ответа заглушки Bot API")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля 429 на sendMessage/editMessageText")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--broadcast-rate", type=float, default=1000.0, help="лимит рассылки, сообщений/с")
+    parser.add_argument("--notify-timeout", type=float, default=600.0)
+    parser.add_argument("--flush-mode", default="batched(100)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="куда записать JSON (по умолчанию stdout)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args), ensure_ascii=False))
+        return
+
+    passthrough = ["--iterations", args.iterations, "--writes", args.writes, "--latency-ms", args.latency_ms,
+                   "--error-rate", args.error_rate, "--retry-after", args.retry_after,
+                   "--broadcast-rate", args.broadcast_rate, "--notify-timeout", args.notify_timeout,
+                   "--flush-mode", args.flush_mode, "--seed", args.seed]
+    runs = []
+    for spec in args.db or DEFAULT_DBS:
+        for backend in args.backends:
+            print(f"bench: {backend} {spec}", file=sys.stderr)
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", "--backend", backend,
+                                  "--db", spec, *map(str, passthrough)],
+                                 check=True, stdout=subprocess.PIPE, text=True)
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    report = {
+        "generated_at": int(time.time()),
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("worker", "backend", "out")},
+        "runs": runs,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
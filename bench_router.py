@@ -0,0 +1,68 @@
+"""Микробенчмарк диспетчеризации: цепочка фильтров telebot против Router.
+
+    python bench_router.py --handlers 10 50 200 --updates 20000
+"""
+import argparse
+import time
+
+import telebot
+from telebot import types
+
+from router import Router
+
+
+def make_message(text):
+    return types.Update.de_json({"update_id": 1, "message": {
+        "message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"},
+        "from": {"id": 1, "is_bot": False, "first_name": "u"}, "text": text}})
+
+
+def make_callback(data):
+    return types.Update.de_json({"update_id": 1, "callback_query": {
+        "id": "1", "chat_instance": "1", "data": data,
+        "from": {"id": 1, "is_bot": False, "first_name": "u"}}})
+
+
+def chain_bot(n):
+    bot = telebot.TeleBot("1:bench", threaded=False)
+    for i in range(n):
+        bot.register_message_handler(lambda m: None, func=lambda m, t=f"button {i}": m.text == t)
+        bot.register_callback_query_handler(lambda c: None, func=lambda c, p=f"act{i}_": c.data.startswith(p))
+    return bot
+
+
+def router_bot(n):
+    bot = telebot.TeleBot("1:bench", threaded=False)
+    router = Router()
+    router.attach(bot)
+    for i in range(n):
+        router.text(f"button {i}")(lambda m: None)
+        router.callback(f"act{i}_")(lambda c: None)
+    return bot
+
+
+def per_update(bot, update, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        bot.process_new_updates([update])
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--handlers", type=int, nargs="+", default=[10, 50, 200, 1000])
+    parser.add_argument("--updates", type=int, default=20000)
+    args = parser.parse_args()
+    print(f"{'handlers':>8} {'kind':>8} {'chain, µs':>10} {'router, µs':>11} {'speedup':>8}")
+    for n in args.handlers:
+        # Худший для цепочки случай — совпадает последний зарегистрированный обработчик.
+        cases = (("text", make_message(f"button {n - 1}")), ("callback", make_callback(f"act{n - 1}_42")))
+        chain, routed = chain_bot(n), router_bot(n)
+        for kind, update in cases:
+            a = per_update(chain, update, args.updates)
+            b = per_update(routed, update, args.updates)
+            print(f"{n:>8} {kind:>8} {a:>10.2f} {b:>11.2f} {a / b:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
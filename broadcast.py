@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from telebot.apihelper import ApiTelegramException
+
+from metrics import BROADCAST_DELIVERIES, BROADCAST_RETRIES
+
+
+GLOBAL_RATE = 30
+CHAT_INTERVAL = 1.0
+MAX_RETRIES = 5
+PROGRESS_EVERY = 3.0
+
+
+class TokenBucket:
+    """Классический token bucket: не больше `rate` отправок в секунду."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+    def pause(self, seconds):
+        """Остановить всех отправителей на `seconds` (ответ 429 с retry_after)."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class ChatLimiter:
+    """Минимальный интервал между сообщениями в один чат."""
+
+    def __init__(self, interval=CHAT_INTERVAL, max_chats=100_000):
+        self.interval = interval
+        self.max_chats = max_chats
+        self._next = {}
+        self.lock = threading.Lock()
+
+    def reserve(self, chat_id):
+        """Занять слот для чата и вернуть, сколько секунд до него ждать."""
+        with self.lock:
+            now = time.monotonic()
+            if len(self._next) >= self.max_chats:
+                self._next = {k: t for k, t in self._next.items() if t > now}
+            slot = max(now, self._next.get(chat_id, 0))
+            self._next[chat_id] = slot + self.interval
+            return slot - now
+
+
+class BroadcastJob:
+    """Состояние рассылки в памяти; источник правды — запись notifications в хранилище."""
+
+    def __init__(self, notification, pending):
+        self.id = notification["notification_id"]
+        self.text = notification["message"]
+        self.parse_mode = notification.get("parse_mode")
+        self.report_to = notification.get("report_to")
+        self.report_message_id = notification.get("report_message_id")
+        self.total = notification["total"]
+        self.sent = notification["sent"]
+        self.failed = notification["failed"]
+        self.blocked = notification["blocked"]
+        self.pending = pending
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def processed(self):
+        return self.sent + self.failed + self.blocked
+
+    def count(self, field):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def progress_text(self):
+        if self.done.is_set():
+            return (f"✅ Рассылка завершена.\nДоставлено: {self.sent}\n"
+                    f"Не доставлено: {self.failed}\nЗаблокировали бота: {self.blocked}")
+        return f"📤 Рассылка: {self.processed}/{self.total}\nДоставлено: {self.sent}, ошибок: {self.failed + self.blocked}"
+
+
+class Broadcaster:
+    """Фоновая рассылка на пуле потоков.
+
+    Соблюдает общий лимит Bot API (~30 сообщений/с) и лимит на чат, на 429
+    ждёт `retry_after` и повторяет, пользователей, заблокировавших бота,
+    помечает в хранилище, чтобы следующие рассылки их пропускали.
+
+    Каждая рассылка — запись в хранилище с курсором и статусом по каждому
+    получателю, поэтому после перезапуска она продолжается с курсора и
+    уже получившим сообщение повторно не отправляется.
+
+    Если `active` сброшен (процесс кластера, который не лидер), рассылка
+    только записывается в хранилище: отправит её лидер через resume_all().
+    """
+
+    def __init__(self, bot, store, workers=8, rate=GLOBAL_RATE, chat_interval=CHAT_INTERVAL, active=True):
+        self.bot = bot
+        self.store = store
+        self.active = active
+        self.bucket = TokenBucket(rate)
+        self.chats = ChatLimiter(chat_interval)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="broadcast")
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def start(self, text, recipients, parse_mode=None, report_to=None, ntype="broadcast"):
+        """Сохранить рассылку в хранилище, запустить её в фоне и сразу вернуть задачу (None — отправит лидер)."""
+        nid = self.store.create_notification(ntype, text, recipients, parse_mode=parse_mode, report_to=report_to)
+        return self._launch(nid) if self.active else None
+
+    def resume_all(self):
+        """Продолжить незавершённые рассылки, которые ещё не идут в этом процессе."""
+        jobs = (self._launch(nid) for nid in self.store.unfinished_notifications())
+        return [job for job in jobs if job is not None]
+
+    def _launch(self, nid):
+        with self._lock:
+            if nid in self._running:
+                return None
+            self._running.add(nid)
+        job = BroadcastJob(self.store.get_notification(nid), self.store.pending_recipients(nid))
+        threading.Thread(target=self._run, args=(job,), name=f"broadcast-{job.id}", daemon=True).start()
+        return job
+
+    def _run(self, job):
+        try:
+            self._send_all(job)
+        finally:
+            with self._lock:
+                self._running.discard(job.id)
+
+    def _send_all(self, job):
+        self._report(job)
+        futures = {self.pool.submit(self._send_one, job, uid): pos for pos, uid in job.pending}
+        order = deque(pos for pos, _ in job.pending)
+        finished = set()
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=PROGRESS_EVERY)
+            finished.update(futures[f] for f in done)
+            # Курсор — первая позиция, до которой обработаны все получатели.
+            moved = False
+            while order and order[0] in finished:
+                finished.discard(order.popleft())
+                moved = True
+            if moved and order:
+                self.store.update_notification(job.id, cursor=order[0])
+            if pending:
+                self._report(job)
+        if not self.active:
+            # Лидерство потеряно: оставшихся получателей дошлёт новый лидер.
+            return
+        self.store.finish_notification(job.id)
+        job.done.set()
+        self._report(job)
+
+    def _send_one(self, job, uid):
+        for _ in range(MAX_RETRIES):
+            if not self.active:
+                return
+            self.bucket.acquire()
+            delay = self.chats.reserve(uid)
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.bot.send_message(int(uid), job.text, parse_mode=job.parse_mode)
+                return self._finish(job, uid, "sent")
+            except ApiTelegramException as e:
+                if e.error_code == 429:
+                    params = (e.result_json or {}).get("parameters") or {}
+                    self.bucket.pause(params.get("retry_after", 1))
+                    BROADCAST_RETRIES.inc()
+                    continue
+                if e.error_code == 403:
+                    self.store.mark_blocked(uid)
+                    return self._finish(job, uid, "blocked")
+                return self._finish(job, uid, "failed")
+            except Exception:
+                return self._finish(job, uid, "failed")
+        self._finish(job, uid, "failed")
+
+    def _finish(self, job, uid, status):
+        self.store.set_recipient_status(job.id, uid, status)
+        job.count(status)
+        BROADCAST_DELIVERIES.inc(status)
+
+    def _report(self, job):
+        if job.report_to is None:
+            return
+        try:
+            if job.report_message_id is None:
+                msg = self.bot.send_message(job.report_to, job.progress_text())
+                job.report_message_id = msg.message_id
+                self.store.update_notification(job.id, report_message_id=msg.message_id)
+            else:
+                self.bot.edit_message_text(job.progress_text(), chat_id=job.report_to, message_id=job.report_message_id)
+        except Exception:
+            pass
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,207 @@
+"""Режим нескольких процессов: диспетчер и N воркеров tg_bot над общим SQLite.
+
+    STORAGE_BACKEND=sqlite python cluster.py --workers 4 --source webhook
+
+Диспетчер принимает апдейты (long polling или вебхук) и раскладывает их
+по процессам по chat_id % N: все апдейты одного чата попадают в один
+процесс и обрабатываются по порядку. Состояние воркеры делят через SQLite
+(WAL), рассылки и периодические задачи выполняет один воркер — лидер,
+выбранный арендой в той же базе. Упавший воркер перезапускается.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+from telebot import apihelper
+
+from webhook import WebhookServer, raw_chat_id
+
+
+class Leader:
+    """Выбор лидера арендой в общем хранилище (SqliteStorage.acquire_lease).
+
+    Раз в `every` секунд аренда продлевается; пока она у этого процесса,
+    выполняются `duties`. Если процесс завис дольше `ttl`, аренду забирает
+    другой. `on_change(leading)` вызывается при каждой смене статуса.
+    """
+
+    def __init__(self, store, owner=None, ttl=15, every=2, duties=(), on_change=None, name="leader"):
+        self.store = store
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.ttl = ttl
+        self.every = min(every, ttl / 3)
+        self.duties = list(duties)
+        self.on_change = on_change
+        self.name = name
+        self.leading = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="leader", daemon=True)
+        self._thread.start()
+        return self
+
+    def tick(self):
+        try:
+            leading = self.store.acquire_lease(self.name, self.owner, self.ttl)
+        except Exception as e:
+            print(f"lease failed: {e!r}")
+            leading = False
+        if leading != self.leading:
+            self.leading = leading
+            if self.on_change:
+                self.on_change(leading)
+        if leading:
+            for duty in self.duties:
+                try:
+                    duty()
+                except Exception as e:
+                    print(f"{getattr(duty, '__name__', duty)} failed: {e!r}")
+
+    def _run(self):
+        while True:
+            self.tick()
+            if self._stop.wait(self.every):
+                return
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.leading:
+            self.leading = False
+            if self.on_change:
+                self.on_change(False)
+            self.store.release_lease(self.name, self.owner)
+
+
+# --------------------- WORKERS ---------------------
+
+def _worker(index, updates):
+    # Ctrl+C приходит всей группе процессов; останавливает воркеров диспетчер.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # У каждого процесса свой файл кэша имён и свой порт метрик.
+    names = os.getenv("NAME_CACHE_PATH") or f"{os.getenv('SQLITE_PATH', 'bot.sqlite3')}.names.json"
+    os.environ["NAME_CACHE_PATH"] = f"{names}.{index}"
+    if int(os.getenv("METRICS_PORT", "0")):
+        os.environ["METRICS_PORT"] = str(int(os.environ["METRICS_PORT"]) + index)
+    import tg_bot
+    tg_bot.run_worker(index, updates)
+
+
+class WorkerPool:
+    """N процессов tg_bot; апдейт уходит в очередь процесса chat_id % N.
+
+    Интерфейс как у webhook.UpdateWorkers (put/backlog/stop), поэтому пул
+    подставляется в WebhookServer вместо потоков.
+    """
+
+    def __init__(self, count, queue_size=1000, target=_worker):
+        self.ctx = multiprocessing.get_context("spawn")
+        self.target = target
+        self.queues = [self.ctx.Queue(max(1, queue_size // count)) for _ in range(count)]
+        self.procs = [self._spawn(i) for i in range(count)]
+        self._stopping = threading.Event()
+        threading.Thread(target=self._supervise, name="supervisor", daemon=True).start()
+
+    def _spawn(self, i):
+        proc = self.ctx.Process(target=self.target, args=(i, self.queues[i]), name=f"tg-worker-{i}")
+        proc.start()
+        return proc
+
+    def _supervise(self):
+        while not self._stopping.wait(1):
+            for i, proc in enumerate(self.procs):
+                if not proc.is_alive() and not self._stopping.is_set():
+                    print(f"worker {i} exited with {proc.exitcode}, restarting")
+                    self.procs[i] = self._spawn(i)
+
+    def put(self, update, chat_id, block=False):
+        try:
+            self.queues[chat_id % len(self.queues)].put(update, block=block)
+            return True
+        except queue.Full:
+            return False
+
+    def backlog(self):
+        return sum(q.qsize() for q in self.queues)
+
+    def stop(self, timeout=30):
+        self._stopping.set()
+        for q in self.queues:
+            q.put(None)
+        deadline = time.monotonic() + timeout
+        for proc in self.procs:
+            proc.join(max(0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.terminate()
+
+
+# --------------------- DISPATCHER ---------------------
+
+def poll(token, pool, timeout=20):
+    """Long polling в диспетчере: апдейты без разбора, как dict, сразу в очереди воркеров."""
+    offset = None
+    while True:
+        try:
+            updates = apihelper.get_updates(token, offset=offset, timeout=timeout, long_polling_timeout=timeout)
+        except Exception as e:
+            print(f"get_updates failed: {e!r}")
+            time.sleep(1)
+            continue
+        for data in updates:
+            offset = data["update_id"] + 1
+            # Очередь воркера полна — ждём: Telegram придержит остальное у себя.
+            pool.put(data, raw_chat_id(data), block=True)
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=int(os.getenv("CLUSTER_WORKERS", os.cpu_count() or 2)))
+    parser.add_argument("--source", choices=("polling", "webhook"), default=os.getenv("CLUSTER_SOURCE", "polling"))
+    parser.add_argument("--queue-size", type=int, default=int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000")))
+    args = parser.parse_args()
+
+    if os.getenv("STORAGE_BACKEND", "json") != "sqlite":
+        sys.exit("cluster: нужен STORAGE_BACKEND=sqlite — JSON-базу может держать только один процесс")
+    if args.source == "webhook" and not os.getenv("WEBHOOK_SECRET"):
+        sys.exit("cluster: задайте WEBHOOK_SECRET — без него апдейт от имени админа может прислать кто угодно")
+    # В batched-режиме транзакция открыта всё окно и держит запись для остальных процессов.
+    if os.getenv("DB_FLUSH_MODE", "immediate").strip().lower() != "immediate":
+        sys.exit(f"cluster: нужен DB_FLUSH_MODE=immediate, задан {os.environ['DB_FLUSH_MODE']}")
+    os.environ["DB_FLUSH_MODE"] = "immediate"
+    if os.getenv("BOT_API_URL"):
+        apihelper.API_URL = os.environ["BOT_API_URL"]
+
+    pool = WorkerPool(args.workers, args.queue_size)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Cluster started: {args.workers} workers, source: {args.source}")
+    try:
+        if args.source == "webhook":
+            host, port = os.getenv("WEBHOOK_LISTEN", "0.0.0.0"), int(os.getenv("WEBHOOK_PORT", "8443"))
+            path, secret = os.getenv("WEBHOOK_PATH", "/webhook"), os.getenv("WEBHOOK_SECRET")
+            server = WebhookServer(None, (host, port), path=path, secret=secret, pool=pool)
+            if os.getenv("WEBHOOK_URL"):
+                apihelper.set_webhook(os.getenv("TOKEN"), url=os.environ["WEBHOOK_URL"].rstrip("/") + path,
+                                      secret_token=secret)
+            print(f"Webhook listening on {host}:{port}{path}")
+            server.serve_forever()
+        else:
+            poll(os.getenv("TOKEN"), pool)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import threading
+import time
+
+
+class Conversations:
+    """Состояние многошаговых диалогов в хранилище вместо register_next_step_handler.
+
+    На чат хранится только имя следующего шага и его небольшие сериализуемые
+    аргументы (ID, уже введённый текст), поэтому диалог переживает перезапуск
+    и может быть продолжен другим воркером. Брошенный диалог истекает через
+    `ttl` секунд; раз в `sweep_every` секунд просроченные состояния удаляются,
+    а если их всё равно больше `maxsize`, удаляются самые старые.
+
+    Шаг — функция `handler(message, *args)`, зарегистрированная через
+    @conversations.step; в хранилище она записывается по имени функции.
+    `wrap` — необязательная обёртка каждого шага (например, замер времени).
+    """
+
+    def __init__(self, store, ttl=1800, maxsize=100_000, sweep_every=60, wrap=None):
+        self.store = store
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.sweep_every = sweep_every
+        self.wrap = wrap
+        self.steps = {}
+        self._handlers = {}
+        self._last_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+
+    def step(self, handler):
+        """Декоратор: разрешить `handler` быть шагом диалога."""
+        self._handlers[handler.__name__] = handler
+        self.steps[handler.__name__] = self.wrap(handler) if self.wrap else handler
+        return handler
+
+    def expect(self, chat_id, handler, *args):
+        """Следующее сообщение из `chat_id` получит `handler(message, *args)`."""
+        if self._handlers.get(handler.__name__) is not handler:
+            raise ValueError(f"{handler.__name__} не зарегистрирован как шаг диалога")
+        self.store.set_conversation(chat_id, handler.__name__, args, int(time.time()))
+        self._maybe_sweep()
+
+    def _current(self, chat_id):
+        state = self.store.get_conversation(chat_id)
+        if state is None or state["step"] not in self.steps or state["updated_at"] < time.time() - self.ttl:
+            return None
+        return state
+
+    def _dispatch(self, message):
+        state = self._current(message.chat.id)
+        if state is None:
+            return
+        # Как и в telebot, шаг снимается до вызова: повтор шаг выставляет сам.
+        self.store.delete_conversation(message.chat.id)
+        self.steps[state["step"]](message, *state["args"])
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_every or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = now
+            self.store.expire_conversations(int(time.time()) - self.ttl, self.maxsize)
+        finally:
+            self._sweep_lock.release()
+
+    def attach(self, bot):
+        """Зарегистрировать в боте раньше остальных обработчиков: шаг диалога перехватывает сообщение."""
+        bot.register_message_handler(self._dispatch, func=lambda m: self._current(m.chat.id) is not None)
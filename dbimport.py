@@ -0,0 +1,250 @@
+"""Импорт и экспорт базы в формате db.json.example.
+
+    python dbimport.py import conference.json
+    python dbimport.py export archive.json
+
+Файл импорта читается потоком (jsonstream), поэтому выгрузка с историей
+многих конференций не поднимается в память целиком: в памяти держатся
+только соответствия ID пользователей, мероприятий и докладов. Экспорт
+пишется так же, по одной записи. Куда писать — как у бота: STORAGE_BACKEND,
+DB_PATH, SQLITE_PATH; для большой истории лучше SQLite — он ничего не
+загружает при старте.
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+import jsonstream
+from storage import open_storage
+from timetable import to_ts
+
+
+# Роли db.json.example -> роли бота и обратно.
+ROLES_IN = {"organizer": "admin", "admin": "admin", "speaker": "speaker", "auditor": "user", "user": "user"}
+ROLES_OUT = {"admin": "organizer", "speaker": "speaker", "user": "auditor"}
+
+PAGE = 500
+
+
+def _ts(iso):
+    return int(to_ts(iso)) if iso else None
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts else None
+
+
+def _sections(path, wanted):
+    with open(path, "r", encoding="utf-8") as f:
+        for key, kind, items in jsonstream.sections(f):
+            if key in wanted and kind == "list":
+                yield key, items
+
+
+# --------------------- IMPORT ---------------------
+
+class Importer:
+    """Перенос выгрузки db.json.example в хранилище бота через его обычный API.
+
+    Ссылки между разделами идут по ID выгрузки, поэтому файл читается в два
+    прохода: сначала пользователи и мероприятия (их мало), затем вопросы и
+    уведомления, которые и составляют основной объём.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.users = {}
+        self.events = {}
+        self.talks = {}
+        self.counts = {"users": 0, "events": 0, "talks": 0, "questions": 0, "notifications": 0, "skipped": 0}
+
+    def run(self, path):
+        events = []
+        for key, items in _sections(path, ("users", "events")):
+            if key == "users":
+                for user in items:
+                    self.add_user(user)
+            else:
+                events.extend(items)
+        for event in events:
+            self.add_event(event)
+        del events
+        for key, items in _sections(path, ("questions", "notifications")):
+            add = self.add_question if key == "questions" else self.add_notification
+            for item in items:
+                add(item)
+        return self.counts
+
+    def add_user(self, user):
+        uid = str(user.get("telegram_id") or user["user_id"])
+        role = ROLES_IN.get(user.get("role"), "user")
+        self.users[user["user_id"]] = (uid, user.get("full_name") or uid)
+        self.store.set_role(uid, role)
+        if role == "speaker" or user.get("speaker_in_talks"):
+            self.store.add_speaker(uid, user.get("full_name") or uid)
+        if user.get("notifications_enabled") is False:
+            self.store.set_notifications_enabled(uid, False)
+        self.counts["users"] += 1
+
+    def _uid(self, user_id):
+        return self.users.get(user_id, (None, None))[0]
+
+    def add_event(self, event):
+        organizer, name = self.users.get(event.get("organizer_id"), (None, None))
+        event_id = self.store.add_event({
+            "title": event["title"],
+            "description": event.get("description", ""),
+            "speaker_id": organizer,
+            "speaker_name": name,
+            "created_at": _ts(event.get("start_time")) or int(datetime.now().timestamp()),
+            "start_time": _ts(event.get("start_time")),
+            "end_time": _ts(event.get("end_time")),
+        })
+        self.events[event["event_id"]] = event_id
+        self.counts["events"] += 1
+        for talk in event.get("schedule", []):
+            speaker = self._uid(talk.get("speaker_id"))
+            try:
+                start, end = _ts(talk.get("start_time")), _ts(talk.get("end_time"))
+            except ValueError:
+                start = end = None
+            # Доклад без времени или с окончанием не позже начала расписание не покажет.
+            if speaker is None or start is None or end is None or end <= start:
+                self.counts["skipped"] += 1
+                continue
+            added = self.store.add_talk(event_id, {"speaker_id": speaker, "title": talk["title"],
+                                                   "start_time": talk["start_time"], "end_time": talk["end_time"]})
+            self.talks[talk["talk_id"]] = added["talk_id"]
+            self.counts["talks"] += 1
+
+    def add_question(self, q):
+        sender, speaker = self._uid(q.get("from_user_id")), self._uid(q.get("to_speaker_id"))
+        # В хранилище бота отправитель и получатель — числовые Telegram ID.
+        if not (sender and sender.isdigit() and speaker and speaker.isdigit()):
+            self.counts["skipped"] += 1
+            return
+        answer = q.get("answer")
+        self.store.add_question({
+            "from": int(sender),
+            "to": int(speaker),
+            "question": q["text"],
+            "answer": answer,
+            "created_at": _ts(q.get("timestamp")),
+            "answered_at": (_ts(q.get("answered_at")) or _ts(q.get("timestamp"))) if answer else None,
+            "event_id": self.events.get(q.get("event_id")),
+            "talk_id": self.talks.get(q.get("talk_id")),
+        })
+        self.counts["questions"] += 1
+
+    def add_notification(self, n):
+        recipients = [uid for uid in map(self._uid, n.get("sent_to_users", [])) if uid]
+        text = "\n\n".join(part for part in (n.get("title"), n.get("message")) if part)
+        # Сразу завершённой: незаконченную рассылку лидер кластера подхватил бы и отправил заново.
+        self.store.create_notification(n.get("type", "import"), text, recipients, state="done",
+                                       created_at=_ts(n.get("created_at")))
+        self.counts["notifications"] += 1
+
+
+# --------------------- EXPORT ---------------------
+
+def _pages(store, kind):
+    after = None
+    while True:
+        items, _, has_next = store.page(kind, after=after, limit=PAGE)
+        yield from items
+        if not has_next or not items:
+            return
+        after = items[-1]["uid" if kind == "users" else "id"]
+
+
+def _export_users(store):
+    speakers, muted = store.speakers(), store.muted_users()
+    for u in _pages(store, "users"):
+        yield {"user_id": u["uid"], "role": ROLES_OUT.get(u["role"], "auditor"),
+               "full_name": speakers.get(u["uid"], ""), "telegram_id": u["uid"],
+               "notifications_enabled": u["uid"] not in muted}
+
+
+def _export_events(store):
+    schedule = {}
+    for t in store.talks():
+        schedule.setdefault(t["event_id"], []).append({
+            "talk_id": str(t["talk_id"]), "speaker_id": t["speaker_id"], "title": t["title"],
+            "start_time": t["start_time"], "end_time": t["end_time"], "is_live": bool(t.get("is_live")),
+        })
+    for e in store.events():
+        yield {"event_id": str(e["id"]), "title": e["title"], "description": e.get("description"),
+               "start_time": _iso(e.get("start_time")), "end_time": _iso(e.get("end_time")),
+               "organizer_id": e.get("speaker_id"), "schedule": schedule.get(e["id"], []), "active_talk_id": None}
+
+
+def _export_questions(store):
+    for q in _pages(store, "questions"):
+        yield {"question_id": str(q["id"]),
+               "event_id": str(q["event_id"]) if q.get("event_id") else None,
+               "talk_id": str(q["talk_id"]) if q.get("talk_id") else None,
+               "from_user_id": str(q["from"]), "to_speaker_id": str(q["to"]),
+               "text": q["question"], "timestamp": _iso(q.get("created_at")),
+               "status": "answered" if q.get("answer") else "sent",
+               "answer": q.get("answer"), "answered_at": _iso(q.get("answered_at"))}
+
+
+def _export_notifications(store):
+    for nid in store.notification_ids():
+        n = store.get_notification(nid)
+        yield {"notification_id": str(nid), "event_id": None, "type": n["type"], "title": "",
+               "message": n["message"], "created_at": _iso(n.get("created_at")),
+               "sent_to_users": store.recipients(nid, "sent")}
+
+
+def export(store, f):
+    """Записать хранилище в формате db.json.example, по одной записи за раз."""
+    sections = (("users", _export_users), ("events", _export_events),
+                ("questions", _export_questions), ("notifications", _export_notifications))
+    counts = {}
+    f.write("{")
+    for i, (key, items) in enumerate(sections):
+        f.write(f'{"," if i else ""}\n  "{key}": [')
+        n = 0
+        for n, item in enumerate(items(store), 1):
+            f.write(("," if n > 1 else "") + "\n    " + json.dumps(item, ensure_ascii=False))
+        f.write("\n  ]" if n else "]")
+        counts[key] = n
+    f.write("\n}\n")
+    return counts
+
+
+# --------------------- CLI ---------------------
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("path", help="файл в формате db.json.example")
+    parser.add_argument("--backend", default=os.getenv("STORAGE_BACKEND", "json"), choices=("json", "sqlite"))
+    parser.add_argument("--db-path", default=os.getenv("DB_PATH"))
+    parser.add_argument("--sqlite-path", default=os.getenv("SQLITE_PATH", "bot.sqlite3"))
+    args = parser.parse_args()
+
+    # Уплотнение JSON-базы — один раз в конце, а не каждые COMPACT_EVERY записей импорта.
+    store = open_storage(args.backend, args.db_path, args.sqlite_path, compact_every=float("inf"),
+                         flush_mode="batched(1000)")
+    try:
+        if args.command == "import":
+            counts = Importer(store).run(args.path)
+            if args.backend == "json":
+                store.flush()
+                store.journal.compact()
+        else:
+            with open(args.path, "w", encoding="utf-8") as f:
+                counts = export(store, f)
+    finally:
+        store.close()
+    print(f"{args.command}:", ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class FakeBotApi(ThreadingHTTPServer):
+    """Локальная заглушка Telegram Bot API для бенчмарков и ручных прогонов.
+
+    Отвечает на методы, которые использует бот, считает вызовы по методам,
+    может добавлять задержку к каждому ответу и с вероятностью `error_rate`
+    отвечать на отправку сообщений 429 с `retry_after`. Бот направляется
+    сюда через `apihelper.API_URL = server.api_url`.
+    """
+
+    daemon_threads = True
+    THROTTLED = ("sendMessage", "editMessageText")
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.0, error_rate=0.0, retry_after=1, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.throttled = 0
+        self.lock = threading.Lock()
+        self._message_ids = itertools.count(1)
+        self._thread = None
+        super().__init__(address, FakeBotApiHandler)
+
+    @property
+    def api_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-bot-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def stats(self):
+        with self.lock:
+            return {"calls": dict(self.calls), "total": sum(self.calls.values()), "throttled": self.throttled}
+
+    def call(self, method, params):
+        """(HTTP-статус, тело ответа) для вызова `method`."""
+        with self.lock:
+            self.calls[method] += 1
+            throttle = method in self.THROTTLED and self.random.random() < self.error_rate
+            if throttle:
+                self.throttled += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if throttle:
+            return 429, {"ok": False, "error_code": 429,
+                         "description": f"Too Many Requests: retry after {self.retry_after}",
+                         "parameters": {"retry_after": self.retry_after}}
+        return 200, {"ok": True, "result": self.result(method, params)}
+
+    def result(self, method, params):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        if method == "getChat":
+            chat_id = int(params.get("chat_id", 0))
+            return {"id": chat_id, "type": "private", "first_name": f"user{chat_id}"}
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            message_id = int(params.get("message_id") or next(self._message_ids))
+            return {"message_id": message_id, "date": int(time.time()), "text": params.get("text", ""),
+                    "chat": {"id": chat_id, "type": "private"}}
+        if method == "getUpdates":
+            return []
+        return True
+
+
+class FakeBotApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Заголовки и тело уходят разными write: без этого keep-alive упирается
+    # в Nagle + delayed ACK (~40 мс на запрос) и меряет не бота, а TCP.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._handle(b"")
+
+    def do_POST(self):
+        self._handle(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+    def _handle(self, body):
+        url = urlsplit(self.path)
+        method = url.path.rsplit("/", 1)[-1]
+        params = dict(parse_qsl(url.query))
+        if body:
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                params.update(json.loads(body))
+            else:
+                params.update(parse_qsl(body.decode("utf-8")))
+        status, payload = self.server.call(method, params)
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API (для бота: apihelper.API_URL).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+    server = FakeBotApi((args.host, args.port), args.latency_ms / 1000, args.error_rate, args.retry_after)
+    print(f"Fake Bot API: {server.api_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
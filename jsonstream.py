@@ -0,0 +1,107 @@
+import json
+
+
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Буфер поверх текстового файла: читает кусками, разобранное отбрасывает."""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        # Кусок растёт вместе с буфером: длинное значение дочитывается за O(log n) раз.
+        chunk = self.f.read(max(self.chunk_size, len(self.buf) - self.pos))
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+
+    def peek(self):
+        """Следующий значащий символ (None в конце файла)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return None
+            self.fill()
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSON: ожидался {char!r}, найден {found!r}")
+        self.pos += 1
+
+    def skip(self, char):
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self.fill()
+                continue
+            # Число на границе куска могло быть прочитано не целиком («95756.» → 95756).
+            if not self.eof and (end == len(self.buf) or self.buf[end] in ".eE"):
+                self.fill()
+                continue
+            self.pos = end
+            return obj
+
+
+def _items(reader):
+    while not reader.skip("]"):
+        yield reader.value()
+        reader.skip(",")
+
+
+def _members(reader):
+    while not reader.skip("}"):
+        key = reader.value()
+        reader.expect(":")
+        yield key, reader.value()
+        reader.skip(",")
+
+
+def sections(f, chunk_size=CHUNK_SIZE):
+    """Разобрать объект верхнего уровня по частям, не читая файл целиком.
+
+    Отдаёт (ключ, вид, содержимое): для массива вид "list" и генератор
+    элементов, для объекта — "dict" и генератор пар (ключ, значение),
+    для остального — "value" и само значение. Недочитанный генератор
+    догоняется перед следующим ключом.
+    """
+    reader = _Reader(f, chunk_size)
+    reader.expect("{")
+    while not reader.skip("}"):
+        key = reader.value()
+        reader.expect(":")
+        if reader.skip("["):
+            items = _items(reader)
+            yield key, "list", items
+        elif reader.skip("{"):
+            items = _members(reader)
+            yield key, "dict", items
+        else:
+            yield key, "value", reader.value()
+            items = ()
+        for _ in items:
+            pass
+        reader.skip(",")
+
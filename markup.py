@@ -0,0 +1,36 @@
+import threading
+
+
+class MarkupRegistry:
+    """Клавиатуры, собранные и сериализованные один раз.
+
+    Хранится готовая JSON-строка reply_markup: telebot передаёт строку в API
+    как есть, так что на ответ не тратятся ни сборка объектов, ни to_json().
+    Статические клавиатуры строятся при первом обращении; динамические
+    пересобираются, только когда меняется их ключ версии. Построитель может
+    вернуть None (клавиатуры нет) — это тоже кэшируется.
+    """
+
+    def __init__(self):
+        self._builders = {}
+        self._cache = {}
+        self.lock = threading.Lock()
+
+    def static(self, name):
+        """Декоратор: зарегистрировать построитель клавиатуры под именем `name`."""
+        def register(build):
+            self._builders[name] = build
+            return build
+        return register
+
+    def get(self, name, version=None, build=None):
+        """Сериализованная клавиатура `name`; при новом `version` — собрать заново через `build`."""
+        with self.lock:
+            cached = self._cache.get(name)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        markup = (build or self._builders[name])()
+        payload = markup.to_json() if markup is not None else None
+        with self.lock:
+            self._cache[name] = (version, payload)
+        return payload
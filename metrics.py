@@ -0,0 +1,294 @@
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as Tally
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Gauge(Metric):
+    """Значение задаётся set() или вычисляется функцией в момент выгрузки."""
+
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with self.lock:
+            self._values[labels] = value
+
+    def set_function(self, fn, *labels):
+        self.set(fn, *labels)
+
+    def samples(self):
+        with self.lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            if callable(value):
+                try:
+                    value = value()
+                except Exception:
+                    continue
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    def samples(self):
+        with self.lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                yield f"{self.name}_bucket", _labels(self.labelnames, labels, [("le", _number(bound))]), running
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _labels(self.labelnames, labels), running
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --------------------- BOT METRICS ---------------------
+
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Время обработки апдейта хендлером.", ["handler"])
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Исключения в хендлерах.", ["handler"])
+API_SECONDS = Histogram("telegram_api_seconds", "Длительность вызовов Bot API.", ["method"])
+API_REQUESTS = Counter("telegram_api_requests_total", "Вызовы Bot API по результату (ok, код ошибки, timeout, error).",
+                       ["method", "result"])
+DB_FLUSH_SECONDS = Histogram("db_flush_seconds", "Сброс изменений хранилища на диск (журнал + fsync / COMMIT).")
+DB_COMPACT_SECONDS = Histogram("db_compact_seconds", "Запись полного снапшота JSON-базы.",
+                               buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+DB_SIZE_BYTES = Gauge("db_size_bytes", "Размер файлов базы на диске.")
+BROADCAST_DELIVERIES = Counter("broadcast_deliveries_total", "Итог доставки рассылок по получателям.", ["status"])
+BROADCAST_RETRIES = Counter("broadcast_retries_total", "Повторы отправки после 429.")
+CONVERSATIONS_PENDING = Gauge("conversations_pending", "Незавершённые многошаговые диалоги.")
+OUTBOX_ITEMS = Counter("outbox_items_total", "Изменения программы в очереди уведомлений по итогу (queued, sent, cancelled).",
+                       ["outcome"])
+FLOOD_DROPPED = Counter("flood_dropped_total", "Апдейты, отброшенные защитой от флуда.", ["scope"])
+UPDATE_BACKLOG = Gauge("update_backlog", "Апдейты, принятые, но ещё не обработанные.")
+PROFILER_SAMPLES = Counter("profiler_samples_total", "Снимки стеков, снятые профайлером.")
+
+
+def timed(handler, name=None):
+    """Обёртка хендлера: гистограмма времени и счётчик исключений."""
+    name = name or handler.__name__
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return handler(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, name)
+    return wrapper
+
+
+def instrument_api(apihelper):
+    """Считать все вызовы Bot API: telebot отправляет их через apihelper._make_request."""
+    original = apihelper._make_request
+    if getattr(original, "instrumented", False):
+        return
+
+    def make_request(token, method_name, method="get", params=None, files=None):
+        start = time.perf_counter()
+        result = "ok"
+        try:
+            return original(token, method_name, method=method, params=params, files=files)
+        except apihelper.ApiTelegramException as e:
+            result = str(e.error_code)
+            raise
+        except Exception as e:
+            result = "timeout" if "Timeout" in type(e).__name__ else "error"
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - start, method_name)
+            API_REQUESTS.inc(method_name, result)
+
+    make_request.instrumented = True
+    apihelper._make_request = make_request
+
+
+# --------------------- PROFILER ---------------------
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер: раз в `interval` секунд снимает стеки всех потоков.
+
+    Результат — collapsed stacks («поток;функция;функция N»), которые сразу
+    читают flamegraph.pl и speedscope. Включается и выключается на ходу.
+    """
+
+    def __init__(self):
+        self.stacks = Tally()
+        self.interval = 0.01
+        self._thread = None
+        self._stop = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=0.01):
+        with self.lock:
+            if self.running:
+                return False
+            self.interval = interval
+            self.stacks = Tally()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.collapsed()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            PROFILER_SAMPLES.inc()
+
+    def collapsed(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+profiler = SamplingProfiler()
+
+
+# --------------------- HTTP ---------------------
+
+class MetricsServer(ThreadingHTTPServer):
+    """Локальный эндпоинт: /metrics, /profile?seconds=N, /profile/start?interval=S, /profile/stop."""
+
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, MetricsRequestHandler)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="metrics", daemon=True).start()
+        return self
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            if url.path == "/metrics":
+                return self._reply(200, render(), "text/plain; version=0.0.4")
+            if url.path == "/profile/start":
+                started = profiler.start(float(query.get("interval", 0.01)))
+                return self._reply(200 if started else 409, "started\n" if started else "already running\n")
+            if url.path == "/profile/stop":
+                return self._reply(200, profiler.stop())
+            if url.path == "/profile":
+                if not profiler.start(float(query.get("interval", 0.01))):
+                    return self._reply(409, "already running\n")
+                time.sleep(min(float(query.get("seconds", 10)), 300))
+                return self._reply(200, profiler.stop())
+        except ValueError:
+            return self._reply(400, "bad parameter\n")
+        self._reply(404, "not found\n")
+
+    def _reply(self, status, text, content_type="text/plain; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class NameCache:
+    """Ограниченный LRU-кэш отображаемых имён пользователей с TTL.
+
+    Неудачные запросы (`negative=True`) тоже кэшируются, но на меньшее время,
+    чтобы недоступный чат не дёргал get_chat на каждом экране. Срок жизни
+    хранится как wall-clock, поэтому кэш можно сохранить и поднять после
+    перезапуска.
+    """
+
+    def __init__(self, maxsize=10_000, ttl=3600, negative_ttl=60, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self._items = OrderedDict()
+        self.lock = threading.Lock()
+        if path:
+            self.load()
+
+    def get(self, uid):
+        key = str(uid)
+        with self.lock:
+            item = self._items.get(key)
+            if item is None or item[1] < time.time():
+                if item is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            if item[2]:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return item[0]
+
+    def put(self, uid, name, negative=False):
+        key = str(uid)
+        expires = time.time() + (self.negative_ttl if negative else self.ttl)
+        with self.lock:
+            self._items[key] = (name, expires, negative)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def remember(self, user):
+        """Положить имя из `from_user` входящего апдейта — без сетевого запроса."""
+        if user is not None:
+            self.put(user.id, display_name(user))
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.negative_hits + self.misses
+            return {
+                "size": len(self._items),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.negative_hits) / total, 3) if total else 0.0,
+            }
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        with self.lock:
+            for key, (name, expires, negative) in raw.items():
+                if expires > now:
+                    self._items[key] = (name, expires, negative)
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            raw = {k: list(v) for k, v in self._items.items()}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(raw, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+def display_name(user):
+    if getattr(user, "username", None):
+        return f"@{user.username}"
+    return getattr(user, "first_name", None) or f"id{user.id}"
@@ -0,0 +1,102 @@
+import threading
+import time
+
+from metrics import OUTBOX_ITEMS
+from render import split_messages
+
+
+class Outbox:
+    """Уведомления об изменениях программы: копятся в хранилище и уходят дайджестом.
+
+    Всё, что накопилось за `window` секунд с первой записи, пользователь
+    получает одним сообщением (длинный дайджест — несколькими по лимиту
+    Telegram). Если мероприятие удалили раньше, чем о нём узнали, не уходит
+    ни создание, ни удаление, ни его доклады. Автор изменения о нём не
+    уведомляется; отключившие уведомления и заблокировавшие бота — тоже.
+
+    Очередь лежит в хранилище: переживает перезапуск, а в кластере её
+    пополняют все процессы, отправляет же лидер (flush среди его обязанностей).
+    """
+
+    HEADER = "🔔 *Изменения в программе:*\n\n"
+
+    def __init__(self, store, broadcaster, window=60, every=5):
+        self.store = store
+        self.broadcaster = broadcaster
+        self.window = window
+        self.every = every
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def event_created(self, event_id, text, exclude=None):
+        self._add("event_created", event_id, text, exclude)
+
+    def talk_added(self, event_id, text, exclude=None):
+        self._add("talk_added", event_id, text, exclude)
+
+    def event_deleted(self, event_id, text, exclude=None):
+        # Неотправленные записи об этом мероприятии больше не нужны.
+        pending = [item for item in self.store.outbox() if item["event_id"] == event_id]
+        taken = set(self.store.take_outbox([item["id"] for item in pending]))
+        if taken:
+            OUTBOX_ITEMS.inc("cancelled", amount=len(taken))
+        if any(item["kind"] == "event_created" and item["id"] in taken for item in pending):
+            OUTBOX_ITEMS.inc("cancelled")
+            return
+        self._add("event_deleted", event_id, text, exclude)
+
+    def _add(self, kind, event_id, text, exclude):
+        self.store.add_outbox(kind, event_id, text, exclude)
+        OUTBOX_ITEMS.inc("queued")
+
+    def digest(self, items):
+        """Тексты сообщений дайджеста для набора записей."""
+        if len(items) == 1:
+            return [items[0]["text"]]
+        chunks = split_messages(self.HEADER, [item["text"] + "\n\n" for item in items])
+        return [chunk.rstrip() for chunk in chunks]
+
+    def flush(self, now=None, force=False):
+        """Разослать накопленное, если окно первой записи истекло; вернуть запущенные рассылки."""
+        now = time.time() if now is None else now
+        with self.lock:
+            items = self.store.outbox()
+            if not items or (not force and now - items[0]["created_at"] < self.window):
+                return []
+            taken = set(self.store.take_outbox([item["id"] for item in items]))
+            items = [item for item in items if item["id"] in taken]
+            if not items:
+                return []
+            skip = self.store.blocked_users() | self.store.muted_users()
+            users = [uid for uid in self.store.user_ids() if uid not in skip]
+            authors = {item["exclude"] for item in items if item["exclude"]}
+            # Одна рассылка на всех и по одной на каждого автора — без его собственных изменений.
+            groups = [(None, [uid for uid in users if uid not in authors])]
+            groups += [(uid, [uid]) for uid in authors.intersection(users)]
+            jobs = []
+            for author, recipients in groups:
+                own = [item for item in items if author is None or item["exclude"] != author]
+                if not own or not recipients:
+                    continue
+                for text in self.digest(own):
+                    jobs.append(self.broadcaster.start(text, recipients, parse_mode="Markdown", ntype="digest"))
+            OUTBOX_ITEMS.inc("sent", amount=len(items))
+            return jobs
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.every):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"outbox flush failed: {e!r}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
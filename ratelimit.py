@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+
+from telebot import util
+
+from metrics import FLOOD_DROPPED
+
+
+class SlidingWindow:
+    """Не больше `limit` событий за `window` секунд на ключ, целиком в памяти.
+
+    Скользящее окно считается по двум корзинам: текущей и предыдущей,
+    взвешенной долей окна, которая ещё не истекла. На ключ хранится три
+    числа, ключей — не больше `maxsize` (вытесняются давно не активные),
+    а ключи без событий за последние два окна удаляются при очистке.
+    """
+
+    def __init__(self, limit, window, maxsize=100_000):
+        self.limit = limit
+        self.window = window
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._last_sweep = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _estimate(self, state, now):
+        start, current, previous = state
+        bucket = now - now % self.window
+        if bucket != start:
+            previous = current if bucket - start == self.window else 0
+            current = 0
+            state[:] = bucket, current, previous
+        return previous * (1 - (now - bucket) / self.window) + current
+
+    def hit(self, key, now=None):
+        """Учесть событие; число событий в окне вместе с этим."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            state = self._keys.get(key)
+            if state is None:
+                state = self._keys[key] = [now - now % self.window, 0, 0]
+                if len(self._keys) > self.maxsize:
+                    self._keys.popitem(last=False)
+            else:
+                self._keys.move_to_end(key)
+            count = self._estimate(state, now)
+            state[1] += 1
+            self._maybe_sweep(now)
+            return int(count) + 1
+
+    def count(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            state = self._keys.get(key)
+            return int(self._estimate(state, now)) if state else 0
+
+    def allow(self, key, now=None):
+        return self.hit(key, now) <= self.limit
+
+    def reset(self, key):
+        with self.lock:
+            self._keys.pop(key, None)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _maybe_sweep(self, now):
+        # Ключи упорядочены по последнему событию: просроченные — в начале.
+        if now - self._last_sweep < self.window:
+            return
+        self._last_sweep = now
+        horizon = now - now % self.window - self.window
+        while self._keys:
+            key, state = next(iter(self._keys.items()))
+            if state[0] >= horizon:
+                break
+            del self._keys[key]
+
+
+class FloodGuard:
+    """Отсекает апдейты от пользователя или чата, превысивших лимит, до хендлеров.
+
+    Регистрируется в боте первым: лишний апдейт забирает пустой обработчик,
+    поэтому до диалогов, роутера и хранилища он не доходит. О превышении
+    пользователь узнаёт один раз за окно. `exempt` — ID, которых не ограничивать.
+    """
+
+    WARNING = "⏳ Слишком много запросов. Подождите немного."
+
+    def __init__(self, bot, user_limit=20, chat_limit=30, window=10, maxsize=100_000, exempt=()):
+        self.bot = bot
+        self.users = SlidingWindow(user_limit, window, maxsize)
+        self.chats = SlidingWindow(chat_limit, window, maxsize)
+        self.warned = SlidingWindow(1, window, maxsize)
+        self.exempt = {str(uid) for uid in exempt}
+
+    def allow(self, user_id, chat_id):
+        if str(user_id) in self.exempt:
+            return True
+        if not self.users.allow(user_id):
+            FLOOD_DROPPED.inc("user")
+            return False
+        if not self.chats.allow(chat_id):
+            FLOOD_DROPPED.inc("chat")
+            return False
+        return True
+
+    def _flooding_message(self, message):
+        return not self.allow(message.from_user.id, message.chat.id)
+
+    def _flooding_callback(self, call):
+        chat_id = call.message.chat.id if call.message else call.from_user.id
+        return not self.allow(call.from_user.id, chat_id)
+
+    def _drop_message(self, message):
+        if self.warned.allow(message.from_user.id):
+            self.bot.send_message(message.chat.id, self.WARNING)
+
+    def _drop_callback(self, call):
+        if self.warned.allow(call.from_user.id):
+            self.bot.answer_callback_query(call.id, self.WARNING)
+
+    def attach(self, bot):
+        """Зарегистрировать в боте раньше всех остальных обработчиков."""
+        bot.register_message_handler(self._drop_message, func=self._flooding_message,
+                                     content_types=util.content_type_media)
+        bot.register_callback_query_handler(self._drop_callback, func=self._flooding_callback)
@@ -0,0 +1,151 @@
+import threading
+from collections import OrderedDict
+
+
+MESSAGE_LIMIT = 4096
+
+_MD_SPECIAL = str.maketrans({c: "\\" + c for c in "_*`["})
+
+
+def escape_md(text):
+    """Экранирование пользовательского текста для parse_mode="Markdown"."""
+    return ("" if text is None else str(text)).translate(_MD_SPECIAL)
+
+
+def split_markdown(block, limit=MESSAGE_LIMIT):
+    """Разрезать Markdown-текст на куски не длиннее `limit`, не ломая разметку.
+
+    Режется по последнему переводу строки или пробелу во второй половине
+    куска, иначе где придётся, но никогда между «\\» и экранированным им символом.
+    Если разрез пришёлся внутрь *…*, _…_ или `…`, сущность закрывается в
+    конце куска и открывается заново в начале следующего.
+    """
+    pieces = []
+    while len(block) > limit:
+        entity = opened = None
+        escaped = False
+        cut = space = line = None
+        for i in range(1, limit):
+            ch = block[i - 1]
+            if escaped:
+                escaped = False
+            elif ch == "\\" and entity != "`" and block[i] in "_*`[":
+                escaped = True
+            elif entity is None and ch in "*_`":
+                entity, opened = ch, i - 1
+            elif ch == entity:
+                entity = None
+            if escaped or (entity is not None and (ch == "\\" or opened == i - 1)):
+                # Закрывающий символ после «\\» стал бы экранированным, а сразу
+                # после открывающего — дал бы пустую сущность.
+                continue
+            cut = (i, entity)
+            if ch == "\n":
+                line = cut
+            elif ch == " ":
+                space = cut
+        if cut is None:
+            # Сплошные «\\» внутри сущности — разметку уже не спасти.
+            cut = (limit, None)
+        elif line is not None and line[0] > limit // 2:
+            cut = line
+        elif space is not None and space[0] > limit // 2:
+            cut = space
+        i, entity = cut
+        if entity is not None and block[i] == entity:
+            # Разрез прямо перед закрывающим символом — он остаётся в этом куске.
+            i, entity = i + 1, None
+        entity = entity or ""
+        pieces.append(block[:i] + entity)
+        block = entity + block[i:]
+    pieces.append(block)
+    return pieces
+
+
+def split_messages(header, blocks, limit=MESSAGE_LIMIT):
+    """Собрать блоки в сообщения не длиннее `limit`, разрывая только между блоками.
+
+    Блок, который сам по себе длиннее лимита, режется split_markdown.
+    """
+    chunks, parts, size = [], [header] if header else [], len(header)
+    for block in blocks:
+        if parts and size + len(block) > limit:
+            chunks.append("".join(parts))
+            parts, size = [], 0
+        *full, block = split_markdown(block, limit)
+        chunks.extend(full)
+        parts.append(block)
+        size += len(block)
+    if parts:
+        chunks.append("".join(parts))
+    return chunks
+
+
+class EscapedFields:
+    """Экранированные поля записей: считаются один раз, при записи, и дальше только читаются.
+
+    Рядом с экранированным хранится исходный текст полей: если запись
+    изменилась (в том числе в другом процессе кластера), get() это видит
+    и экранирует заново, а не отдаёт устаревший текст.
+
+    Ограничен по размеру (LRU); запись, выпавшая из кэша, экранируется заново
+    при следующем обращении.
+    """
+
+    def __init__(self, fields, maxsize=10_000):
+        self.fields = fields
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _raw(self, record):
+        return tuple(record.get(f) for f in self.fields)
+
+    def put(self, key, record):
+        raw = self._raw(record)
+        parts = {f: escape_md(value) for f, value in zip(self.fields, raw)}
+        with self.lock:
+            self._items[key] = (raw, parts)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return parts
+
+    def get(self, key, record):
+        with self.lock:
+            item = self._items.get(key)
+            if item is not None and item[0] == self._raw(record):
+                self._items.move_to_end(key)
+                return item[1]
+        return self.put(key, record)
+
+    def discard(self, key):
+        with self.lock:
+            self._items.pop(key, None)
+
+
+class RenderedList:
+    """Готовые к отправке сообщения списка, пересобираемые только при смене версии.
+
+    `version()` дёшево сообщает, менялись ли данные; пока не менялись,
+    messages() возвращает уже собранные куски без обращения к `load()`.
+    """
+
+    def __init__(self, load, version, render, header="", limit=MESSAGE_LIMIT):
+        self.load = load
+        self.version = version
+        self.render = render
+        self.header = header
+        self.limit = limit
+        self._version = None
+        self._messages = []
+        self.lock = threading.Lock()
+
+    def messages(self):
+        version = self.version()
+        with self.lock:
+            if version != self._version:
+                blocks = [self.render(n, record) for n, record in enumerate(self.load(), 1)]
+                self._messages = split_messages(self.header, blocks, self.limit) if blocks else []
+                self._version = version
+            return self._messages
@@ -0,0 +1,56 @@
+class Router:
+    """Диспетчер апдейтов без линейного перебора фильтров.
+
+    Тексты кнопок reply-клавиатуры ищутся точным совпадением в словаре.
+    callback_data — сначала точное совпадение, затем таблица префиксов,
+    разложенная по первому сегменту до «_» (`q_`, `talk_event_` → `q`,
+    `talk`), внутри сегмента выигрывает самый длинный префикс. Всё, что
+    роутер не знает, проходит дальше по обычным фильтрам telebot.
+
+    `wrap` — необязательная обёртка каждого обработчика (например, замер времени).
+    """
+
+    def __init__(self, wrap=None):
+        self.wrap = wrap
+        self.texts = {}
+        self.exact = {}
+        self.prefixes = {}
+
+    def text(self, *texts):
+        """Декоратор: обработчик сообщений с одним из `texts`."""
+        def register(handler):
+            wrapped = self.wrap(handler) if self.wrap else handler
+            for t in texts:
+                self.texts[t] = wrapped
+            return handler
+        return register
+
+    def callback(self, *keys):
+        """Декоратор: ключ, оканчивающийся на «_», — префикс, иначе точное значение callback_data."""
+        def register(handler):
+            wrapped = self.wrap(handler) if self.wrap else handler
+            for key in keys:
+                if key.endswith("_"):
+                    bucket = self.prefixes.setdefault(key.partition("_")[0], [])
+                    bucket.append((key, wrapped))
+                    bucket.sort(key=lambda item: -len(item[0]))
+                else:
+                    self.exact[key] = wrapped
+            return handler
+        return register
+
+    def resolve_callback(self, data):
+        handler = self.exact.get(data)
+        if handler is not None or not data:
+            return handler
+        for prefix, handler in self.prefixes.get(data.partition("_")[0], ()):
+            if data.startswith(prefix):
+                return handler
+        return None
+
+    def attach(self, bot):
+        """Зарегистрировать роутер в боте; вызывать до остальных обработчиков."""
+        bot.register_message_handler(lambda m: self.texts[m.text](m),
+                                     func=lambda m: m.text in self.texts)
+        bot.register_callback_query_handler(lambda c: self.resolve_callback(c.data)(c),
+                                            func=lambda c: self.resolve_callback(c.data) is not None)
@@ -0,0 +1,1486 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from itertools import islice
+
+from metrics import DB_COMPACT_SECONDS, DB_FLUSH_SECONDS
+from textindex import InvertedIndex, words
+
+
+COMPACT_EVERY = 1000
+
+
+def empty_db():
+    return {"roles": {}, "events": [], "speakers": {}, "questions": {}, "password_attempts": {}}
+
+
+def _resolve(data, path):
+    """Дойти до контейнера, которому принадлежит последний элемент пути."""
+    node = data
+    for key in path[:-1]:
+        node = node[key] if isinstance(node, list) else node.setdefault(key, {})
+    return node, path[-1]
+
+
+def apply_op(data, rec):
+    """Применить одну запись журнала к словарю базы."""
+    op = rec["op"]
+    node, key = _resolve(data, rec["path"])
+    if op == "set":
+        node[key] = rec["value"]
+    elif op == "update":
+        node[key].update(rec["value"])
+    elif op == "del":
+        if isinstance(node, list):
+            del node[key]
+        else:
+            node.pop(key, None)
+    elif op == "append":
+        if isinstance(node, list):
+            node[key].append(rec["value"])
+        else:
+            node.setdefault(key, []).append(rec["value"])
+    else:
+        raise ValueError(f"unknown journal op: {op}")
+
+
+def parse_flush_mode(spec):
+    """'immediate' | 'batched(200)' / 'batched:200' | 'on-shutdown' -> (режим, окно в секундах)."""
+    spec = (spec or "immediate").strip().lower()
+    if spec in ("immediate", "on-shutdown"):
+        return spec, 0.0
+    m = re.fullmatch(r"batched(?:\((\d+)\)|:(\d+))?", spec)
+    if not m:
+        raise ValueError(f"unknown flush mode: {spec}")
+    ms = m.group(1) or m.group(2) or "100"
+    return "batched", int(ms) / 1000
+
+
+class GroupCommitter:
+    """Копит «грязные» изменения и сбрасывает их на диск пачкой.
+
+    immediate   — сброс прямо в вызывающем потоке;
+    batched     — фоновый поток собирает всё, что пришло за окно, в один сброс;
+    on-shutdown — сброс только при close().
+    """
+
+    def __init__(self, flush, mode="immediate", window=0.0):
+        self._flush_fn = flush
+        self.mode = mode
+        self.window = window
+        self._dirty = False
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = None
+        if mode == "batched":
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def _flush(self):
+        start = time.perf_counter()
+        self._flush_fn()
+        DB_FLUSH_SECONDS.observe(time.perf_counter() - start)
+
+    def mark_dirty(self):
+        if self.mode == "immediate":
+            return self._flush()
+        with self._cond:
+            self._dirty = True
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+            time.sleep(self.window)
+            with self._cond:
+                self._dirty = False
+            self._flush()
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+        self._flush()
+
+
+class JournalStore:
+    """База в памяти + журнал изменений на диске.
+
+    Каждое изменение дописывается в `<path>.journal` одной строкой JSON,
+    поэтому стоимость записи не зависит от размера базы. При старте журнал
+    проигрывается поверх последнего снапшота. Фоновое уплотнение пишет
+    новый снапшот через временный файл и os.replace.
+
+    Записи копятся в памяти и уходят на диск через GroupCommitter, так что
+    несколько изменений одного действия пользователя дают одну запись и
+    один fsync.
+    """
+
+    def __init__(self, path, compact_every=COMPACT_EVERY, flush_mode="immediate"):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.old_journal_path = path + ".journal.old"
+        self.compact_every = compact_every
+        # lock защищает данные, io_lock — файлы; порядок захвата: compact_lock -> io_lock -> lock.
+        self.lock = threading.RLock()
+        self.io_lock = threading.Lock()
+        # Одна компакция за раз: вторая, повернув журнал, дописала бы в старый
+        # журнал записи, которые первая затем удалит вместе с ним.
+        self.compact_lock = threading.Lock()
+        self._compacting = False
+        self._closed = False
+        self._pending = []
+        self._depth = 0
+        self._deferred = False
+        self.data, self.seq, self._since_snapshot = self._load()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        mode, window = parse_flush_mode(flush_mode)
+        self.committer = GroupCommitter(self.flush, mode, window)
+
+    # --------------------- LOAD ---------------------
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.path):
+            return empty_db(), 0
+        # Битый снапшот — повод остановиться, а не стартовать с пустой базой.
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data, data.pop("_seq", 0)
+
+    def _load(self):
+        data, seq = self._read_snapshot()
+        replayed = 0
+        for jp in (self.old_journal_path, self.journal_path):
+            seq, n = self._replay(jp, data, seq)
+            replayed += n
+        return data, seq, replayed
+
+    @staticmethod
+    def _replay(path, data, seq):
+        if not os.path.exists(path):
+            return seq, 0
+        n = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # Оборванная последняя строка после падения процесса.
+                    break
+                if rec["seq"] <= seq:
+                    continue
+                apply_op(data, rec)
+                seq = rec["seq"]
+                n += 1
+        return seq, n
+
+    # --------------------- MUTATIONS ---------------------
+
+    def _record(self, op, path, **extra):
+        with self.lock:
+            self.seq += 1
+            rec = {"seq": self.seq, "op": op, "path": list(path), **extra}
+            apply_op(self.data, rec)
+            self._pending.append(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._since_snapshot += 1
+            need_compact = self._since_snapshot >= self.compact_every and not self._compacting
+            if need_compact:
+                self._compacting = True
+            # Внутри transaction() сбрасывать нельзя: flush берёт io_lock,
+            # а порядок захвата — io_lock -> lock.
+            defer = self._depth > 0
+            if defer:
+                self._deferred = True
+        if not defer:
+            self.committer.mark_dirty()
+        if need_compact:
+            threading.Thread(target=self._compact_in_background, daemon=True).start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        finally:
+            self._compacting = False
+
+    @contextmanager
+    def transaction(self):
+        """Несколько изменений под одной блокировкой; сброс на диск — после выхода."""
+        with self.lock:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                dirty = self._deferred and self._depth == 0
+                if dirty:
+                    self._deferred = False
+        if dirty:
+            self.committer.mark_dirty()
+
+    def flush(self):
+        """Дописать накопленные записи в журнал и сделать fsync."""
+        with self.io_lock:
+            with self.lock:
+                lines, self._pending = self._pending, []
+            if not lines or self._journal.closed:
+                return
+            self._journal.write("".join(lines))
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def set(self, path, value):
+        self._record("set", path, value=value)
+
+    def update(self, path, value):
+        self._record("update", path, value=value)
+
+    def delete(self, path):
+        self._record("del", path)
+
+    def append(self, path, value):
+        self._record("append", path, value=value)
+
+    # --------------------- COMPACTION ---------------------
+
+    def _rotate_journal(self):
+        self._journal.close()
+        if os.path.exists(self.old_journal_path):
+            # Предыдущее уплотнение не завершилось — не теряем его записи.
+            with open(self.journal_path, "r", encoding="utf-8") as src, \
+                    open(self.old_journal_path, "a", encoding="utf-8") as dst:
+                dst.write(src.read())
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self.old_journal_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def compact(self):
+        """Записать новый снапшот атомарно и обнулить журнал.
+
+        Под блокировкой только дописывается и переключается журнал. Сам
+        снапшот собирается без блокировки из прежнего снапшота и старого
+        журнала — живые данные в это время продолжают меняться.
+        """
+        with self.compact_lock:
+            started = time.perf_counter()
+            with self.io_lock, self.lock:
+                # Несброшенные записи уходят в старый журнал: до os.replace снапшота
+                # они должны оставаться на диске.
+                self._journal.write("".join(self._pending))
+                self._pending = []
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+                self._rotate_journal()
+                self._since_snapshot = 0
+            data, seq = self._read_snapshot()
+            seq, _ = self._replay(self.old_journal_path, data, seq)
+            data["_seq"] = seq
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            os.remove(self.old_journal_path)
+            DB_COMPACT_SECONDS.observe(time.perf_counter() - started)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.committer.close()
+        with self.io_lock:
+            self._journal.close()
+
+
+# --------------------- STORAGE API ---------------------
+
+class JsonStorage:
+    """Репозиторий поверх JournalStore: вся база в памяти, как и раньше.
+
+    Вопросы хранятся словарём по id. Поверх него держатся вторичные индексы
+    (по получателю, по отправителю, неотвеченные, по словам текста), которые
+    обновляются на каждой вставке, ответе и удалении. Для постраничных списков админки
+    ключи пользователей, спикеров, мероприятий и вопросов лежат в заранее
+    отсортированных списках.
+    """
+
+    def __init__(self, path, compact_every=COMPACT_EVERY, flush_mode="immediate"):
+        self.journal = JournalStore(path, compact_every=compact_every, flush_mode=flush_mode)
+        self.db = self.journal.data
+        with self.journal.transaction():
+            for i, event in enumerate(self.db.get("events", [])):
+                if "id" not in event:
+                    self.journal.set(["events", i, "id"], self._next_id("events"))
+            questions = self.db.get("questions", {})
+            if isinstance(questions, list):
+                # Старый формат: список без id -> словарь по id, одной записью журнала.
+                by_id = {}
+                for q in questions:
+                    q = dict(q, id=q.get("id") or self._next_id("questions"))
+                    by_id[str(q["id"])] = q
+                self.journal.set(["questions"], by_id)
+            for n in list(self.db.get("notifications", {}).values()):
+                if n["state"] == "done" and "recipients" in n:
+                    self.finish_notification(n["notification_id"])
+        self._q_to = {}
+        self._q_from = {}
+        self._unanswered = set()
+        self._q_words = InvertedIndex()
+        for q in self.db.get("questions", {}).values():
+            self._index_question(q)
+        self._events_by_id = {e["id"]: e for e in self.db.get("events", [])}
+        self._sorted = {
+            "users": sorted(self.db.get("roles", {})),
+            "speakers": sorted(self.db.get("speakers", {})),
+            "events": sorted(self._events_by_id),
+            "questions": sorted(q["id"] for q in self.db.get("questions", {}).values()),
+        }
+        self._versions = {"events": 0, "speakers": 0, "talks": 0}
+
+    def _next_id(self, kind):
+        with self.journal.transaction():
+            n = self.db.get("next_ids", {}).get(kind, 1)
+            self.journal.set(["next_ids", kind], n + 1)
+            return n
+
+    def _index_question(self, q):
+        self._q_to.setdefault(q["to"], {})[q["id"]] = None
+        self._q_from.setdefault(q["from"], {})[q["id"]] = None
+        if not q.get("answer"):
+            self._unanswered.add(q["id"])
+        self._q_words.add(q["id"], q["question"])
+
+    def _unindex_question(self, q):
+        self._q_to.get(q["to"], {}).pop(q["id"], None)
+        self._q_from.get(q["from"], {}).pop(q["id"], None)
+        self._unanswered.discard(q["id"])
+        self._q_words.remove(q["id"], q["question"])
+
+    def _sorted_add(self, kind, key):
+        keys = self._sorted[kind]
+        i = bisect_left(keys, key)
+        if i == len(keys) or keys[i] != key:
+            keys.insert(i, key)
+
+    def _sorted_remove(self, kind, key):
+        keys = self._sorted[kind]
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+
+    # ---------- pages ----------
+
+    PAGE_KEYS = {"users": str, "speakers": str, "events": int, "questions": int}
+
+    def _page_item(self, kind, key):
+        if kind == "users":
+            return {"uid": key, "role": self.db["roles"][key]}
+        if kind == "speakers":
+            return {"uid": key, "name": self.db["speakers"][key]}
+        if kind == "events":
+            return self._events_by_id[key]
+        return self.db["questions"][str(key)]
+
+    def page(self, kind, after=None, before=None, start=None, limit=10):
+        """Срез отсортированного списка по курсору: (элементы, есть_пред, есть_след)."""
+        cast = self.PAGE_KEYS[kind]
+        with self.journal.transaction():
+            keys = self._sorted[kind]
+            if before is not None:
+                j = bisect_left(keys, cast(before))
+                i = max(0, j - limit)
+            else:
+                if after is not None:
+                    i = bisect_right(keys, cast(after))
+                elif start is not None:
+                    i = bisect_left(keys, cast(start))
+                else:
+                    i = 0
+                j = i + limit
+            return [self._page_item(kind, k) for k in keys[i:j]], i > 0, j < len(keys)
+
+    # ---------- roles ----------
+
+    def get_role(self, uid):
+        return self.db.get("roles", {}).get(str(uid))
+
+    def set_role(self, uid, role):
+        with self.journal.transaction():
+            self.journal.set(["roles", str(uid)], role)
+            self._sorted_add("users", str(uid))
+
+    def delete_role(self, uid):
+        with self.journal.transaction():
+            self.journal.delete(["roles", str(uid)])
+            self._sorted_remove("users", str(uid))
+
+    def user_ids(self):
+        return list(self.db.get("roles", {}))
+
+    def remove_user(self, uid):
+        uid_s = str(uid)
+        with self.journal.transaction():
+            self.delete_role(uid_s)
+            self.remove_speaker(uid_s)
+            qids = list(self._q_from.get(int(uid), ())) + list(self._q_to.get(int(uid), ()))
+            for qid in qids:
+                self.delete_question(qid)
+
+    # ---------- speakers ----------
+
+    def speakers(self):
+        return dict(self.db.get("speakers", {}))
+
+    def speaker_name(self, uid):
+        return self.db.get("speakers", {}).get(str(uid))
+
+    def speakers_version(self):
+        return self._versions["speakers"]
+
+    def add_speaker(self, uid, name):
+        with self.journal.transaction():
+            self.journal.set(["speakers", str(uid)], name)
+            self._sorted_add("speakers", str(uid))
+            self._versions["speakers"] += 1
+
+    def remove_speaker(self, uid):
+        with self.journal.transaction():
+            if str(uid) not in self.db.get("speakers", {}):
+                return
+            self.journal.delete(["speakers", str(uid)])
+            self._sorted_remove("speakers", str(uid))
+            self._versions["speakers"] += 1
+
+    # ---------- events ----------
+
+    def events(self):
+        return list(self.db.get("events", []))
+
+    def events_version(self):
+        """Растёт при каждом добавлении/удалении мероприятия — ключ для кэша списка."""
+        return self._versions["events"]
+
+    def get_event(self, event_id):
+        return self._events_by_id.get(event_id)
+
+    def add_event(self, event):
+        with self.journal.transaction():
+            event = dict(event, id=self._next_id("events"))
+            self.journal.append(["events"], event)
+            self._events_by_id[event["id"]] = self.db["events"][-1]
+            self._sorted_add("events", event["id"])
+            self._versions["events"] += 1
+        return event["id"]
+
+    def delete_event(self, event_id):
+        with self.journal.transaction():
+            event = self._events_by_id.pop(event_id, None)
+            if event is None:
+                return None
+            self.journal.delete(["events", self.db["events"].index(event)])
+            self._sorted_remove("events", event_id)
+            self._versions["events"] += 1
+            self._versions["talks"] += 1
+        return event
+
+    # ---------- talks (schedule) ----------
+
+    def talks(self):
+        return [dict(t, event_id=e["id"]) for e in self.db.get("events", []) for t in e.get("schedule", [])]
+
+    def talks_version(self):
+        return self._versions["talks"]
+
+    def add_talk(self, event_id, talk):
+        with self.journal.transaction():
+            event = self._events_by_id.get(event_id)
+            if event is None:
+                return None
+            talk = dict(talk, talk_id=self._next_id("talks"), is_live=False)
+            self.journal.append(["events", self.db["events"].index(event), "schedule"], talk)
+            self._versions["talks"] += 1
+        return dict(talk, event_id=event_id)
+
+    # ---------- questions ----------
+
+    def questions_to(self, uid):
+        qs = self.db.get("questions", {})
+        return [qs[str(qid)] for qid in list(self._q_to.get(int(uid), ()))]
+
+    def questions_from(self, uid, answered=None):
+        qs = self.db.get("questions", {})
+        ids = list(self._q_from.get(int(uid), ()))
+        if answered is not None:
+            ids = [qid for qid in ids if (qid not in self._unanswered) == answered]
+        return [qs[str(qid)] for qid in ids]
+
+    def get_question(self, qid):
+        return self.db.get("questions", {}).get(str(qid))
+
+    def add_question(self, question):
+        with self.journal.transaction():
+            question = dict(question, id=self._next_id("questions"))
+            self.journal.set(["questions", str(question["id"])], question)
+            self._index_question(question)
+            self._sorted_add("questions", question["id"])
+        return question["id"]
+
+    def answer_question(self, qid, answer, answered_at):
+        with self.journal.transaction():
+            q = self.get_question(qid)
+            if q is None:
+                return None
+            self.journal.update(["questions", str(qid)], {"answer": answer, "answered_at": answered_at})
+            self._unanswered.discard(q["id"])
+            return q
+
+    def search_questions(self, text="", to=None, sender=None, answered=None, since=None, until=None,
+                         after=None, before=None, limit=10):
+        """Вопросы со всеми словами `text` (по префиксу) и под фильтры, новые первыми.
+
+        Возвращает (вопросы, есть_новее, есть_старше); `before`/`after` — id,
+        от которого листать к более старым/новым. Кандидаты — пересечение
+        индексов, начиная с самого маленького; по времени фильтруется только оно.
+        """
+        with self.journal.transaction():
+            qs = self.db.get("questions", {})
+            sets = []
+            found = self._q_words.search(text)
+            if found is not None:
+                sets.append(found)
+            if to is not None:
+                sets.append(self._q_to.get(int(to), {}).keys())
+            if sender is not None:
+                sets.append(self._q_from.get(int(sender), {}).keys())
+            if answered is False:
+                sets.append(self._unanswered)
+            sets.sort(key=len)
+            if sets and len(sets[0]) * 8 < len(qs):
+                ids, sets = sorted(set(sets[0]).intersection(*sets[1:])), []
+            else:
+                # Условия почти ничего не отсекают: дешевле идти по всем id и проверять вхождение.
+                ids = self._sorted["questions"]
+
+            def match(qid):
+                if any(qid not in ids_ for ids_ in sets):
+                    return False
+                created = qs[str(qid)].get("created_at") or 0
+                return ((answered is not True or qid not in self._unanswered)
+                        and (since is None or created >= since) and (until is None or created < until))
+
+            if after is not None:
+                i = bisect_right(ids, int(after))
+                found = list(islice(filter(match, (ids[k] for k in range(i, len(ids)))), limit + 1))
+                has_newer, has_older = len(found) > limit, True
+                found = found[:limit][::-1]
+            else:
+                j = bisect_left(ids, int(before)) if before is not None else len(ids)
+                found = list(islice(filter(match, (ids[k] for k in range(j - 1, -1, -1))), limit + 1))
+                has_newer, has_older = before is not None, len(found) > limit
+                found = found[:limit]
+            return [qs[str(qid)] for qid in found], has_newer, has_older
+
+    def delete_question(self, qid):
+        with self.journal.transaction():
+            q = self.get_question(qid)
+            if q is None:
+                return False
+            self.journal.delete(["questions", str(qid)])
+            self._unindex_question(q)
+            self._sorted_remove("questions", q["id"])
+        return True
+
+    # ---------- password attempts ----------
+
+    def get_attempts(self, uid):
+        return dict(self.db.get("password_attempts", {}).get(str(uid), {"tries": 0}))
+
+    def set_attempts(self, uid, attempts):
+        self.journal.set(["password_attempts", str(uid)], attempts)
+
+    def delete_attempts(self, uid):
+        with self.journal.transaction():
+            if str(uid) in self.db.get("password_attempts", {}):
+                self.journal.delete(["password_attempts", str(uid)])
+
+    def expire_attempts(self, now):
+        """Удалить истёкшие блокировки (и записи без блокировки из старых баз)."""
+        with self.journal.transaction():
+            expired = [uid for uid, a in self.db.get("password_attempts", {}).items()
+                       if a.get("blocked_until", 0) < now]
+            for uid in expired:
+                self.journal.delete(["password_attempts", uid])
+        return len(expired)
+
+    # ---------- blocked users ----------
+
+    def blocked_users(self):
+        return set(self.db.get("blocked", {}))
+
+    def mark_blocked(self, uid):
+        self.journal.set(["blocked", str(uid)], int(time.time()))
+
+    def unmark_blocked(self, uid):
+        if str(uid) in self.db.get("blocked", {}):
+            self.journal.delete(["blocked", str(uid)])
+
+    # ---------- notification settings ----------
+
+    def muted_users(self):
+        return set(self.db.get("muted", {}))
+
+    def notifications_enabled(self, uid):
+        return str(uid) not in self.db.get("muted", {})
+
+    def set_notifications_enabled(self, uid, enabled):
+        if not enabled:
+            self.journal.set(["muted", str(uid)], int(time.time()))
+        elif str(uid) in self.db.get("muted", {}):
+            self.journal.delete(["muted", str(uid)])
+
+    # ---------- outbox (event changes waiting for the digest) ----------
+
+    def add_outbox(self, kind, event_id, text, exclude=None):
+        with self.journal.transaction():
+            oid = self._next_id("outbox")
+            self.journal.set(["outbox", str(oid)], {
+                "id": oid,
+                "kind": kind,
+                "event_id": event_id,
+                "text": text,
+                "exclude": None if exclude is None else str(exclude),
+                "created_at": time.time(),
+            })
+        return oid
+
+    def outbox(self):
+        return sorted(self.db.get("outbox", {}).values(), key=lambda item: item["id"])
+
+    def take_outbox(self, ids):
+        """Удалить записи очереди; вернуть id тех, что ещё были на месте."""
+        with self.journal.transaction():
+            outbox = self.db.get("outbox", {})
+            taken = [oid for oid in ids if str(oid) in outbox]
+            for oid in taken:
+                self.journal.delete(["outbox", str(oid)])
+        return taken
+
+    # ---------- notifications (broadcast jobs) ----------
+
+    def create_notification(self, ntype, message, recipients, parse_mode=None, report_to=None,
+                            state="running", created_at=None):
+        """state="done" — уже разосланное (импорт): все получатели считаются
+        получившими, и, как у завершённых рассылок, остаются только счётчики."""
+        recipients = [str(uid) for uid in recipients]
+        with self.journal.transaction():
+            nid = self._next_id("notifications")
+            n = {
+                "notification_id": nid,
+                "type": ntype,
+                "message": message,
+                "parse_mode": parse_mode,
+                "created_at": created_at or int(time.time()),
+                "report_to": report_to,
+                "report_message_id": None,
+                "state": state,
+            }
+            if state == "done":
+                n.update(cursor=len(recipients), total=len(recipients), sent=len(recipients), failed=0, blocked=0)
+            else:
+                n.update(recipients=recipients, cursor=0, recipient_status={})
+            self.journal.set(["notifications", str(nid)], n)
+        return nid
+
+    def get_notification(self, nid):
+        n = self.db.get("notifications", {}).get(str(nid))
+        if n is None:
+            return None
+        if "recipients" not in n:
+            return dict(n)
+        counts = {"sent": 0, "failed": 0, "blocked": 0}
+        for status in n["recipient_status"].values():
+            counts[status] += 1
+        fields = {k: v for k, v in n.items() if k not in ("recipients", "recipient_status")}
+        return dict(fields, total=len(n["recipients"]), **counts)
+
+    def pending_recipients(self, nid):
+        """(позиция, uid) ещё не обработанных получателей, начиная с курсора."""
+        n = self.db["notifications"][str(nid)]
+        if "recipients" not in n:
+            return []
+        status = n["recipient_status"]
+        return [(pos, uid) for pos, uid in enumerate(n["recipients"][n["cursor"]:], n["cursor"]) if uid not in status]
+
+    def set_recipient_status(self, nid, uid, status):
+        self.journal.set(["notifications", str(nid), "recipient_status", str(uid)], status)
+
+    def update_notification(self, nid, **fields):
+        self.journal.update(["notifications", str(nid)], fields)
+
+    def finish_notification(self, nid):
+        """Завершить рассылку: вместо списка получателей и статусов остаются только счётчики."""
+        with self.journal.transaction():
+            n = self.get_notification(nid)
+            if n is None:
+                return
+            self.journal.set(["notifications", str(nid)], dict(n, cursor=n["total"], state="done"))
+
+    def unfinished_notifications(self):
+        return [n["notification_id"] for n in self.db.get("notifications", {}).values() if n["state"] != "done"]
+
+    def notification_ids(self):
+        return [n["notification_id"] for n in self.db.get("notifications", {}).values()]
+
+    def recipients(self, nid, status=None):
+        """Получатели незавершённой рассылки; у завершённых остались только счётчики."""
+        n = self.db["notifications"][str(nid)]
+        return [uid for uid in n.get("recipients", ()) if status is None or n["recipient_status"].get(uid) == status]
+
+    # ---------- conversations (multi-step dialogs) ----------
+
+    def get_conversation(self, chat_id):
+        return self.db.get("conversations", {}).get(str(chat_id))
+
+    def set_conversation(self, chat_id, step, args, updated_at):
+        self.journal.set(["conversations", str(chat_id)], {"step": step, "args": list(args), "updated_at": updated_at})
+
+    def delete_conversation(self, chat_id):
+        if str(chat_id) in self.db.get("conversations", {}):
+            self.journal.delete(["conversations", str(chat_id)])
+
+    def expire_conversations(self, before, keep):
+        """Удалить состояния старше `before` и самые старые сверх `keep`; вернуть, сколько удалено."""
+        with self.journal.transaction():
+            convs = self.db.get("conversations", {})
+            by_age = sorted(convs, key=lambda k: convs[k]["updated_at"])
+            stale = sum(1 for k in by_age if convs[k]["updated_at"] < before)
+            doomed = by_age[:max(stale, len(by_age) - keep)]
+            for chat_id in doomed:
+                self.journal.delete(["conversations", chat_id])
+        return len(doomed)
+
+    def conversation_count(self):
+        return len(self.db.get("conversations", {}))
+
+    def size_bytes(self):
+        paths = (self.journal.path, self.journal.journal_path, self.journal.old_journal_path)
+        return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+    def flush(self):
+        self.journal.flush()
+
+    def close(self):
+        self.journal.close()
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS roles (
+    uid TEXT PRIMARY KEY,
+    role TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_roles_role ON roles(role);
+
+CREATE TABLE IF NOT EXISTS speakers (
+    uid TEXT PRIMARY KEY,
+    name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    description TEXT,
+    speaker_id TEXT,
+    speaker_name TEXT,
+    created_at INTEGER,
+    start_time INTEGER,
+    end_time INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_events_time ON events(start_time, end_time);
+
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS talks (
+    talk_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id INTEGER NOT NULL,
+    speaker_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    is_live INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_talks_time ON talks(start_time, end_time);
+CREATE INDEX IF NOT EXISTS idx_talks_event ON talks(event_id);
+
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    from_id INTEGER NOT NULL,
+    to_id INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT,
+    created_at INTEGER,
+    answered_at INTEGER,
+    event_id INTEGER,
+    talk_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_questions_from ON questions(from_id, answered_at);
+CREATE INDEX IF NOT EXISTS idx_questions_to ON questions(to_id);
+CREATE INDEX IF NOT EXISTS idx_questions_unanswered ON questions(to_id) WHERE answer IS NULL;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(words);
+
+CREATE TABLE IF NOT EXISTS password_attempts (
+    uid TEXT PRIMARY KEY,
+    tries INTEGER NOT NULL DEFAULT 0,
+    blocked_until REAL
+);
+
+CREATE TABLE IF NOT EXISTS blocked_users (
+    uid TEXT PRIMARY KEY,
+    blocked_at INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS muted_users (
+    uid TEXT PRIMARY KEY,
+    muted_at INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    event_id INTEGER,
+    text TEXT NOT NULL,
+    exclude TEXT,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    message TEXT NOT NULL,
+    parse_mode TEXT,
+    created_at INTEGER,
+    cursor INTEGER NOT NULL DEFAULT 0,
+    report_to INTEGER,
+    report_message_id INTEGER,
+    state TEXT NOT NULL DEFAULT 'running',
+    total INTEGER,
+    sent INTEGER,
+    failed INTEGER,
+    blocked INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_state ON notifications(state);
+
+CREATE TABLE IF NOT EXISTS notification_recipients (
+    notification_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    uid TEXT NOT NULL,
+    status TEXT,
+    PRIMARY KEY (notification_id, position)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notification_recipients_uid ON notification_recipients(notification_id, uid);
+
+CREATE TABLE IF NOT EXISTS conversations (
+    chat_id TEXT PRIMARY KEY,
+    step TEXT NOT NULL,
+    args TEXT NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(updated_at);
+
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# Колонки, появившиеся после первой версии схемы: в старых базах добавляются при открытии.
+SQLITE_ADDED_COLUMNS = {
+    "questions": (("event_id", "INTEGER"), ("talk_id", "INTEGER")),
+    "notifications": (("total", "INTEGER"), ("sent", "INTEGER"), ("failed", "INTEGER"), ("blocked", "INTEGER")),
+}
+
+EVENT_COLUMNS = "id, title, description, speaker_id, speaker_name, created_at, start_time, end_time"
+TALK_COLUMNS = "talk_id, event_id, speaker_id, title, start_time, end_time, is_live"
+QUESTION_COLUMNS = 'id, from_id AS "from", to_id AS "to", question, answer, created_at, answered_at, event_id, talk_id'
+
+
+def _dict_factory(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+class SqliteStorage:
+    """Тот же репозиторий поверх SQLite (WAL) с индексами под запросы бота."""
+
+    def __init__(self, path, flush_mode="immediate"):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = _dict_factory
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.create_function("search_words", 1, lambda text: " ".join(words(text)), deterministic=True)
+        self.conn.executescript(SQLITE_SCHEMA)
+        self._add_columns()
+        self._index_questions()
+        mode, window = parse_flush_mode(flush_mode)
+        self.committer = GroupCommitter(self.flush, mode, window)
+        self._closed = False
+        # Завершённые рассылки из старых баз: статусы получателей больше не нужны.
+        for r in self._query("SELECT id FROM notifications WHERE state = 'done' AND total IS NULL"):
+            self.finish_notification(r["id"])
+
+    def _add_columns(self):
+        for table, columns in SQLITE_ADDED_COLUMNS.items():
+            have = {r["name"] for r in self.conn.execute(f"PRAGMA table_info({table})")}
+            for name, decl in columns:
+                if name not in have:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+    def _index_questions(self):
+        # База старше полнотекстового поиска: проиндексировать уже накопленные вопросы.
+        if self.conn.execute("SELECT 1 FROM questions_fts LIMIT 1").fetchone() is None:
+            self.conn.execute("INSERT INTO questions_fts(rowid, words) SELECT id, search_words(question) FROM questions")
+            self.conn.commit()
+
+    def _query(self, sql, args=()):
+        with self.lock:
+            return self.conn.execute(sql, args).fetchall()
+
+    def _one(self, sql, args=()):
+        with self.lock:
+            return self.conn.execute(sql, args).fetchone()
+
+    def _write(self, sql, args=()):
+        with self.lock:
+            cur = self.conn.execute(sql, args)
+        self.committer.mark_dirty()
+        return cur
+
+    # ---------- pages ----------
+
+    PAGE_SOURCES = {
+        "users": ("roles", "uid", "uid, role", str),
+        "speakers": ("speakers", "uid", "uid, name", str),
+        "events": ("events", "id", EVENT_COLUMNS, int),
+        "questions": ("questions", "id", QUESTION_COLUMNS, int),
+    }
+
+    def page(self, kind, after=None, before=None, start=None, limit=10):
+        """Срез по индексу первичного ключа: (элементы, есть_пред, есть_след)."""
+        table, key, cols, cast = self.PAGE_SOURCES[kind]
+        with self.lock:
+            if before is not None:
+                rows = self._query(f"SELECT {cols} FROM {table} WHERE {key} < ? ORDER BY {key} DESC LIMIT ?",
+                                   (cast(before), limit + 1))
+                has_prev = len(rows) > limit
+                rows = rows[:limit][::-1]
+                has_next = self._one(f"SELECT 1 FROM {table} WHERE {key} >= ? LIMIT 1", (cast(before),)) is not None
+                return rows, has_prev, has_next
+            if after is not None:
+                where, args = f"WHERE {key} > ?", (cast(after),)
+            elif start is not None:
+                where, args = f"WHERE {key} >= ?", (cast(start),)
+            else:
+                where, args = "", ()
+            rows = self._query(f"SELECT {cols} FROM {table} {where} ORDER BY {key} LIMIT ?", (*args, limit + 1))
+            has_next = len(rows) > limit
+            rows = rows[:limit]
+            has_prev = bool(args) and self._one(
+                f"SELECT 1 FROM {table} WHERE {key} < ? LIMIT 1", (rows[0][key] if rows else args[0],)) is not None
+        return rows, has_prev, has_next
+
+    # ---------- roles ----------
+
+    def get_role(self, uid):
+        row = self._one("SELECT role FROM roles WHERE uid = ?", (str(uid),))
+        return row["role"] if row else None
+
+    def set_role(self, uid, role):
+        self._write("INSERT INTO roles(uid, role) VALUES (?, ?) "
+                    "ON CONFLICT(uid) DO UPDATE SET role = excluded.role", (str(uid), role))
+
+    def delete_role(self, uid):
+        self._write("DELETE FROM roles WHERE uid = ?", (str(uid),))
+
+    def user_ids(self):
+        return [r["uid"] for r in self._query("SELECT uid FROM roles")]
+
+    def remove_user(self, uid):
+        with self.lock:
+            self.conn.execute("DELETE FROM roles WHERE uid = ?", (str(uid),))
+            if self.conn.execute("DELETE FROM speakers WHERE uid = ?", (str(uid),)).rowcount:
+                self._bump("speakers")
+            self.conn.execute("DELETE FROM questions_fts WHERE rowid IN "
+                              "(SELECT id FROM questions WHERE from_id = ? OR to_id = ?)", (int(uid), int(uid)))
+            self.conn.execute("DELETE FROM questions WHERE from_id = ? OR to_id = ?", (int(uid), int(uid)))
+        self.committer.mark_dirty()
+
+    # ---------- speakers ----------
+
+    def speakers(self):
+        return {r["uid"]: r["name"] for r in self._query("SELECT uid, name FROM speakers")}
+
+    def speaker_name(self, uid):
+        row = self._one("SELECT name FROM speakers WHERE uid = ?", (str(uid),))
+        return row["name"] if row else None
+
+    def speakers_version(self):
+        return self._version("speakers")
+
+    def add_speaker(self, uid, name):
+        with self.lock:
+            self.conn.execute("INSERT INTO speakers(uid, name) VALUES (?, ?) "
+                              "ON CONFLICT(uid) DO UPDATE SET name = excluded.name", (str(uid), name))
+            self._bump("speakers")
+        self.committer.mark_dirty()
+
+    def remove_speaker(self, uid):
+        with self.lock:
+            if self.conn.execute("DELETE FROM speakers WHERE uid = ?", (str(uid),)).rowcount:
+                self._bump("speakers")
+        self.committer.mark_dirty()
+
+    # ---------- events ----------
+
+    def events(self):
+        return self._query(f"SELECT {EVENT_COLUMNS} FROM events ORDER BY id")
+
+    def get_event(self, event_id):
+        return self._one(f"SELECT {EVENT_COLUMNS} FROM events WHERE id = ?", (event_id,))
+
+    def events_version(self):
+        """Счётчик изменений списка мероприятий; хранится в базе, поэтому виден всем процессам."""
+        return self._version("events")
+
+    def _version(self, name):
+        row = self._one("SELECT value FROM counters WHERE name = ?", (name,))
+        return row["value"] if row else 0
+
+    def _bump(self, name):
+        self.conn.execute("INSERT INTO counters(name, value) VALUES (?, 1) "
+                          "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def add_event(self, event):
+        with self.lock:
+            cur = self.conn.execute(
+                "INSERT INTO events(title, description, speaker_id, speaker_name, created_at, start_time, end_time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (event["title"], event.get("description"), event.get("speaker_id"), event.get("speaker_name"),
+                 event.get("created_at"), event.get("start_time"), event.get("end_time")))
+            self._bump("events")
+        self.committer.mark_dirty()
+        return cur.lastrowid
+
+    def delete_event(self, event_id):
+        with self.lock:
+            event = self.get_event(event_id)
+            if event is None:
+                return None
+            self.conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+            self.conn.execute("DELETE FROM talks WHERE event_id = ?", (event_id,))
+            self._bump("events")
+            self._bump("talks")
+        self.committer.mark_dirty()
+        return event
+
+    # ---------- talks (schedule) ----------
+
+    def talks(self):
+        return self._query(f"SELECT {TALK_COLUMNS} FROM talks ORDER BY start_time")
+
+    def talks_version(self):
+        return self._version("talks")
+
+    def add_talk(self, event_id, talk):
+        with self.lock:
+            if self.get_event(event_id) is None:
+                return None
+            cur = self.conn.execute(
+                "INSERT INTO talks(event_id, speaker_id, title, start_time, end_time) VALUES (?, ?, ?, ?, ?)",
+                (event_id, talk["speaker_id"], talk["title"], talk["start_time"], talk["end_time"]))
+            self._bump("talks")
+            talk = self._one(f"SELECT {TALK_COLUMNS} FROM talks WHERE talk_id = ?", (cur.lastrowid,))
+        self.committer.mark_dirty()
+        return talk
+
+    # ---------- questions ----------
+
+    def questions_to(self, uid):
+        return self._query(f"SELECT {QUESTION_COLUMNS} FROM questions WHERE to_id = ? ORDER BY id", (int(uid),))
+
+    def questions_from(self, uid, answered=None):
+        sql = f"SELECT {QUESTION_COLUMNS} FROM questions WHERE from_id = ?"
+        if answered is True:
+            sql += " AND answer IS NOT NULL"
+        elif answered is False:
+            sql += " AND answer IS NULL"
+        return self._query(sql + " ORDER BY id", (int(uid),))
+
+    def get_question(self, qid):
+        return self._one(f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id = ?", (qid,))
+
+    def add_question(self, question):
+        with self.lock:
+            cur = self.conn.execute(
+                "INSERT INTO questions(from_id, to_id, question, answer, created_at, answered_at, event_id, talk_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (question["from"], question["to"], question["question"], question.get("answer"),
+                 question.get("created_at"), question.get("answered_at"), question.get("event_id"),
+                 question.get("talk_id")))
+            self.conn.execute("INSERT INTO questions_fts(rowid, words) VALUES (?, search_words(?))",
+                              (cur.lastrowid, question["question"]))
+        self.committer.mark_dirty()
+        return cur.lastrowid
+
+    def answer_question(self, qid, answer, answered_at):
+        with self.lock:
+            cur = self.conn.execute("UPDATE questions SET answer = ?, answered_at = ? WHERE id = ?",
+                                    (answer, answered_at, qid))
+            if not cur.rowcount:
+                return None
+            question = self.get_question(qid)
+        self.committer.mark_dirty()
+        return question
+
+    def search_questions(self, text="", to=None, sender=None, answered=None, since=None, until=None,
+                         after=None, before=None, limit=10):
+        """Вопросы со всеми словами `text` (по префиксу, через FTS5) и под фильтры, новые первыми.
+
+        Возвращает (вопросы, есть_новее, есть_старше); `before`/`after` — id,
+        от которого листать к более старым/новым.
+        """
+        where, args = [], []
+        terms = words(text)
+        if terms:
+            where.append("id IN (SELECT rowid FROM questions_fts WHERE questions_fts MATCH ?)")
+            args.append(" AND ".join(f'"{term}"*' for term in terms))
+        for cond, value in (("to_id = ?", to), ("from_id = ?", sender), ("created_at >= ?", since),
+                            ("created_at < ?", until)):
+            if value is not None:
+                where.append(cond)
+                args.append(int(value))
+        if answered is not None:
+            where.append("answer IS NOT NULL" if answered else "answer IS NULL")
+        if after is not None:
+            where.append("id > ?")
+            args.append(int(after))
+        elif before is not None:
+            where.append("id < ?")
+            args.append(int(before))
+        sql = f"SELECT {QUESTION_COLUMNS} FROM questions {'WHERE ' + ' AND '.join(where) if where else ''}"
+        rows = self._query(f"{sql} ORDER BY id {'ASC' if after is not None else 'DESC'} LIMIT ?", (*args, limit + 1))
+        more, rows = len(rows) > limit, rows[:limit]
+        if after is not None:
+            return rows[::-1], more, True
+        return rows, before is not None, more
+
+    def delete_question(self, qid):
+        with self.lock:
+            cur = self.conn.execute("DELETE FROM questions WHERE id = ?", (qid,))
+            self.conn.execute("DELETE FROM questions_fts WHERE rowid = ?", (qid,))
+        self.committer.mark_dirty()
+        return cur.rowcount > 0
+
+    # ---------- password attempts ----------
+
+    def get_attempts(self, uid):
+        row = self._one("SELECT tries, blocked_until FROM password_attempts WHERE uid = ?", (str(uid),))
+        if not row:
+            return {"tries": 0}
+        if row["blocked_until"] is None:
+            row.pop("blocked_until")
+        return row
+
+    def set_attempts(self, uid, attempts):
+        self._write("INSERT INTO password_attempts(uid, tries, blocked_until) VALUES (?, ?, ?) "
+                    "ON CONFLICT(uid) DO UPDATE SET tries = excluded.tries, blocked_until = excluded.blocked_until",
+                    (str(uid), attempts.get("tries", 0), attempts.get("blocked_until")))
+
+    def delete_attempts(self, uid):
+        self._write("DELETE FROM password_attempts WHERE uid = ?", (str(uid),))
+
+    def expire_attempts(self, now):
+        """Удалить истёкшие блокировки (и записи без блокировки из старых баз)."""
+        cur = self._write("DELETE FROM password_attempts WHERE blocked_until IS NULL OR blocked_until < ?", (now,))
+        return cur.rowcount
+
+    # ---------- blocked users ----------
+
+    def blocked_users(self):
+        return {r["uid"] for r in self._query("SELECT uid FROM blocked_users")}
+
+    def mark_blocked(self, uid):
+        self._write("INSERT OR REPLACE INTO blocked_users(uid, blocked_at) VALUES (?, ?)", (str(uid), int(time.time())))
+
+    def unmark_blocked(self, uid):
+        # Вызывается на каждый /start: запись и коммит — только если пользователь был в списке.
+        if self._one("SELECT 1 FROM blocked_users WHERE uid = ?", (str(uid),)) is not None:
+            self._write("DELETE FROM blocked_users WHERE uid = ?", (str(uid),))
+
+    # ---------- notification settings ----------
+
+    def muted_users(self):
+        return {r["uid"] for r in self._query("SELECT uid FROM muted_users")}
+
+    def notifications_enabled(self, uid):
+        return self._one("SELECT 1 FROM muted_users WHERE uid = ?", (str(uid),)) is None
+
+    def set_notifications_enabled(self, uid, enabled):
+        if enabled:
+            self._write("DELETE FROM muted_users WHERE uid = ?", (str(uid),))
+        else:
+            self._write("INSERT OR REPLACE INTO muted_users(uid, muted_at) VALUES (?, ?)", (str(uid), int(time.time())))
+
+    # ---------- outbox (event changes waiting for the digest) ----------
+
+    def add_outbox(self, kind, event_id, text, exclude=None):
+        cur = self._write("INSERT INTO outbox(kind, event_id, text, exclude, created_at) VALUES (?, ?, ?, ?, ?)",
+                          (kind, event_id, text, None if exclude is None else str(exclude), time.time()))
+        return cur.lastrowid
+
+    def outbox(self):
+        return self._query("SELECT id, kind, event_id, text, exclude, created_at FROM outbox ORDER BY id")
+
+    def take_outbox(self, ids):
+        """Удалить записи очереди; вернуть id тех, что ещё были на месте (их не забрал другой процесс)."""
+        ids = list(ids)
+        if not ids:
+            return []
+        with self.lock:
+            rows = self.conn.execute(f"DELETE FROM outbox WHERE id IN ({', '.join('?' * len(ids))}) RETURNING id",
+                                     ids).fetchall()
+        self.committer.mark_dirty()
+        return sorted(r["id"] for r in rows)
+
+    # ---------- notifications (broadcast jobs) ----------
+
+    NOTIFICATION_FIELDS = ("cursor", "report_message_id", "state", "created_at")
+
+    def create_notification(self, ntype, message, recipients, parse_mode=None, report_to=None,
+                            state="running", created_at=None):
+        """state="done" — уже разосланное (импорт): получатели не записываются, только счётчики."""
+        created_at = created_at or int(time.time())
+        with self.lock:
+            if state == "done":
+                total = len(recipients)
+                nid = self.conn.execute(
+                    "INSERT INTO notifications(type, message, parse_mode, created_at, report_to, state, cursor, "
+                    "total, sent, failed, blocked) VALUES (?, ?, ?, ?, ?, 'done', ?, ?, ?, 0, 0)",
+                    (ntype, message, parse_mode, created_at, report_to, total, total, total)).lastrowid
+            else:
+                nid = self.conn.execute(
+                    "INSERT INTO notifications(type, message, parse_mode, created_at, report_to) VALUES (?, ?, ?, ?, ?)",
+                    (ntype, message, parse_mode, created_at, report_to)).lastrowid
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO notification_recipients(notification_id, position, uid) VALUES (?, ?, ?)",
+                    [(nid, pos, str(uid)) for pos, uid in enumerate(recipients)])
+        self.committer.mark_dirty()
+        return nid
+
+    def get_notification(self, nid):
+        with self.lock:
+            n = self._one("SELECT id AS notification_id, type, message, parse_mode, created_at, cursor, report_to, "
+                          "report_message_id, state, total, sent, failed, blocked FROM notifications WHERE id = ?", (nid,))
+            if n is None:
+                return None
+            if n["total"] is not None:
+                return n
+            for field in ("total", "sent", "failed", "blocked"):
+                del n[field]
+            counts = {"sent": 0, "failed": 0, "blocked": 0}
+            total = 0
+            for r in self._query("SELECT status, COUNT(*) AS n FROM notification_recipients "
+                                 "WHERE notification_id = ? GROUP BY status", (nid,)):
+                total += r["n"]
+                if r["status"]:
+                    counts[r["status"]] = r["n"]
+        return dict(n, total=total, **counts)
+
+    def pending_recipients(self, nid):
+        """(позиция, uid) ещё не обработанных получателей, начиная с курсора."""
+        rows = self._query(
+            "SELECT r.position, r.uid FROM notification_recipients r JOIN notifications n ON n.id = r.notification_id "
+            "WHERE r.notification_id = ? AND r.position >= n.cursor AND r.status IS NULL ORDER BY r.position", (nid,))
+        return [(r["position"], r["uid"]) for r in rows]
+
+    def set_recipient_status(self, nid, uid, status):
+        self._write("UPDATE notification_recipients SET status = ? WHERE notification_id = ? AND uid = ?",
+                    (status, nid, str(uid)))
+
+    def update_notification(self, nid, **fields):
+        fields = {k: v for k, v in fields.items() if k in self.NOTIFICATION_FIELDS}
+        if fields:
+            assignments = ", ".join(f"{k} = ?" for k in fields)
+            self._write(f"UPDATE notifications SET {assignments} WHERE id = ?", (*fields.values(), nid))
+
+    def finish_notification(self, nid):
+        """Завершить рассылку: статусы получателей удаляются, в записи остаются счётчики."""
+        with self.lock:
+            n = self.get_notification(nid)
+            if n is None:
+                return
+            self.conn.execute("UPDATE notifications SET state = 'done', cursor = ?, total = ?, sent = ?, failed = ?, "
+                              "blocked = ? WHERE id = ?", (n["total"], n["total"], n["sent"], n["failed"], n["blocked"], nid))
+            self.conn.execute("DELETE FROM notification_recipients WHERE notification_id = ?", (nid,))
+        self.committer.mark_dirty()
+
+    def unfinished_notifications(self):
+        return [r["id"] for r in self._query("SELECT id FROM notifications WHERE state != 'done' ORDER BY id")]
+
+    def notification_ids(self):
+        return [r["id"] for r in self._query("SELECT id FROM notifications ORDER BY id")]
+
+    def recipients(self, nid, status=None):
+        sql = "SELECT uid FROM notification_recipients WHERE notification_id = ?"
+        args = (nid,)
+        if status is not None:
+            sql, args = sql + " AND status = ?", (nid, status)
+        return [r["uid"] for r in self._query(sql + " ORDER BY position", args)]
+
+    # ---------- conversations (multi-step dialogs) ----------
+
+    def get_conversation(self, chat_id):
+        row = self._one("SELECT step, args, updated_at FROM conversations WHERE chat_id = ?", (str(chat_id),))
+        return dict(row, args=json.loads(row["args"])) if row else None
+
+    def set_conversation(self, chat_id, step, args, updated_at):
+        self._write("INSERT OR REPLACE INTO conversations(chat_id, step, args, updated_at) VALUES (?, ?, ?, ?)",
+                    (str(chat_id), step, json.dumps(list(args), ensure_ascii=False), updated_at))
+
+    def delete_conversation(self, chat_id):
+        self._write("DELETE FROM conversations WHERE chat_id = ?", (str(chat_id),))
+
+    def expire_conversations(self, before, keep):
+        """Удалить состояния старше `before` и самые старые сверх `keep`; вернуть, сколько удалено."""
+        with self.lock:
+            removed = self.conn.execute("DELETE FROM conversations WHERE updated_at < ?", (before,)).rowcount
+            excess = self.conn.execute("SELECT COUNT(*) AS n FROM conversations").fetchone()["n"] - keep
+            if excess > 0:
+                removed += self.conn.execute(
+                    "DELETE FROM conversations WHERE chat_id IN "
+                    "(SELECT chat_id FROM conversations ORDER BY updated_at LIMIT ?)", (excess,)).rowcount
+        self.committer.mark_dirty()
+        return removed
+
+    def conversation_count(self):
+        return self._one("SELECT COUNT(*) AS n FROM conversations")["n"]
+
+    # ---------- leases (leader election between processes) ----------
+
+    def acquire_lease(self, name, owner, ttl):
+        """Взять или продлить аренду `name` на `ttl` секунд; True, если она у `owner`.
+
+        Чужую аренду можно перехватить только после её истечения. Коммит —
+        сразу, независимо от режима сброса: аренду должны видеть другие процессы.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO leases(name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at < ?", (name, owner, now + ttl, now))
+            row = self.conn.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()
+            self.conn.commit()
+        return row["owner"] == owner
+
+    def release_lease(self, name, owner):
+        with self.lock:
+            self.conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+            self.conn.commit()
+
+    def size_bytes(self):
+        paths = (self.path, self.path + "-wal")
+        return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+    def flush(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.committer.close()
+        with self.lock:
+            self.conn.close()
+
+
+def open_storage(backend, db_path, sqlite_path, compact_every=COMPACT_EVERY, flush_mode="immediate"):
+    if backend == "sqlite":
+        return SqliteStorage(sqlite_path, flush_mode=flush_mode)
+    if backend == "json":
+        return JsonStorage(db_path, compact_every=compact_every, flush_mode=flush_mode)
+    raise ValueError(f"unknown storage backend: {backend}")
+
+
+def migrate_json_to_sqlite(source, target):
+    """Разово перенести базу JsonStorage (снапшот + журнал) в SqliteStorage."""
+    data = source.db
+    with target.lock:
+        conn = target.conn
+        conn.executemany("INSERT OR REPLACE INTO roles(uid, role) VALUES (?, ?)", data.get("roles", {}).items())
+        conn.executemany("INSERT OR REPLACE INTO speakers(uid, name) VALUES (?, ?)", data.get("speakers", {}).items())
+        conn.executemany(
+            "INSERT OR REPLACE INTO events(id, title, description, speaker_id, speaker_name, created_at, start_time, end_time) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(e["id"], e["title"], e.get("description"), e.get("speaker_id"), e.get("speaker_name"),
+              e.get("created_at"), e.get("start_time"), e.get("end_time")) for e in data.get("events", [])])
+        target._bump("events")
+        target._bump("speakers")
+        target._bump("talks")
+        conn.executemany(
+            "INSERT OR REPLACE INTO questions(id, from_id, to_id, question, answer, created_at, answered_at, event_id, talk_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(q["id"], q["from"], q["to"], q["question"], q.get("answer"), q.get("created_at"), q.get("answered_at"),
+              q.get("event_id"), q.get("talk_id"))
+             for q in data.get("questions", {}).values()])
+        conn.executemany("INSERT OR REPLACE INTO questions_fts(rowid, words) VALUES (?, search_words(?))",
+                         [(q["id"], q["question"]) for q in data.get("questions", {}).values()])
+        conn.executemany(
+            "INSERT OR REPLACE INTO talks(talk_id, event_id, speaker_id, title, start_time, end_time, is_live) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(t["talk_id"], e["id"], t["speaker_id"], t["title"], t["start_time"], t["end_time"], int(t.get("is_live", False)))
+             for e in data.get("events", []) for t in e.get("schedule", [])])
+        conn.executemany(
+            "INSERT OR REPLACE INTO password_attempts(uid, tries, blocked_until) VALUES (?, ?, ?)",
+            [(uid, a.get("tries", 0), a.get("blocked_until")) for uid, a in data.get("password_attempts", {}).items()])
+        conn.executemany("INSERT OR REPLACE INTO blocked_users(uid, blocked_at) VALUES (?, ?)",
+                         data.get("blocked", {}).items())
+        conn.executemany("INSERT OR REPLACE INTO muted_users(uid, muted_at) VALUES (?, ?)", data.get("muted", {}).items())
+        conn.executemany(
+            "INSERT OR REPLACE INTO outbox(id, kind, event_id, text, exclude, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [(o["id"], o["kind"], o["event_id"], o["text"], o["exclude"], o["created_at"])
+             for o in data.get("outbox", {}).values()])
+        for n in data.get("notifications", {}).values():
+            conn.execute(
+                "INSERT OR REPLACE INTO notifications(id, type, message, parse_mode, created_at, cursor, report_to, "
+                "report_message_id, state, total, sent, failed, blocked) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (n["notification_id"], n["type"], n["message"], n.get("parse_mode"), n.get("created_at"), n["cursor"],
+                 n.get("report_to"), n.get("report_message_id"), n["state"],
+                 n.get("total"), n.get("sent"), n.get("failed"), n.get("blocked")))
+            conn.executemany(
+                "INSERT OR REPLACE INTO notification_recipients(notification_id, position, uid, status) VALUES (?, ?, ?, ?)",
+                [(n["notification_id"], pos, uid, n["recipient_status"].get(uid))
+                 for pos, uid in enumerate(n.get("recipients", ()))])
+        conn.executemany(
+            "INSERT OR REPLACE INTO conversations(chat_id, step, args, updated_at) VALUES (?, ?, ?, ?)",
+            [(chat_id, c["step"], json.dumps(c["args"], ensure_ascii=False), c["updated_at"])
+             for chat_id, c in data.get("conversations", {}).items()])
+        conn.commit()
+    return {kind: len(data.get(kind, [])) for kind in ("roles", "speakers", "events", "questions")}
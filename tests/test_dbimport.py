@@ -0,0 +1,87 @@
+import io
+import json
+
+import pytest
+
+from dbimport import Importer, export
+from storage import open_storage
+
+
+def talk(talk_id, start, end):
+    return {"talk_id": talk_id, "speaker_id": "user_03", "title": talk_id,
+            "start_time": f"2025-11-26T{start}:00", "end_time": f"2025-11-26T{end}:00"}
+
+
+DOC = {
+    "events": [{
+        "event_id": "e1", "title": "Конференция", "organizer_id": "user_01",
+        "start_time": "2025-11-26T09:00:00", "end_time": "2025-11-26T18:00:00",
+        "schedule": [talk("ok", "10:00", "11:00"), talk("zero", "12:00", "12:00"),
+                     talk("inverted", "14:00", "13:00"), dict(talk("broken", "15:00", "16:00"), end_time="завтра")],
+    }],
+    "users": [
+        {"user_id": "user_01", "role": "organizer", "full_name": "Орг", "telegram_id": "101"},
+        {"user_id": "user_02", "role": "auditor", "full_name": "Слушатель", "telegram_id": "102",
+         "notifications_enabled": False},
+        {"user_id": "user_03", "role": "speaker", "full_name": "Спикер", "telegram_id": "103"},
+    ],
+    "questions": [
+        {"question_id": "q1", "event_id": "e1", "talk_id": "ok", "from_user_id": "user_02",
+         "to_speaker_id": "user_03", "text": "Как дела?", "timestamp": "2025-11-26T10:15:00", "status": "sent"},
+    ],
+    "notifications": [
+        {"notification_id": "n1", "event_id": "e1", "type": "schedule_update", "title": "Перенос",
+         "message": "Доклад перенесён", "created_at": "2025-11-26T12:00:00",
+         "sent_to_users": ["user_01", "user_02", "user_03"]},
+    ],
+}
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def open_store(request, tmp_path):
+    stores = []
+
+    def open_(name="db"):
+        store = open_storage(request.param, str(tmp_path / f"{name}.json"), str(tmp_path / f"{name}.sqlite3"))
+        stores.append(store)
+        return store
+
+    yield open_
+    for store in stores:
+        store.close()
+
+
+def run_import(store, doc, tmp_path):
+    path = tmp_path / "import.json"
+    path.write_text(json.dumps(doc, ensure_ascii=False), encoding="utf-8")
+    return Importer(store).run(str(path))
+
+
+def test_degenerate_talks_are_skipped(open_store, tmp_path):
+    store = open_store()
+    counts = run_import(store, DOC, tmp_path)
+    assert counts["talks"] == 1
+    assert counts["skipped"] == 3
+    assert [t["title"] for t in store.talks()] == ["ok"]
+
+
+def test_notifications_are_imported_finished(open_store, tmp_path):
+    store = open_store()
+    run_import(store, DOC, tmp_path)
+    assert store.unfinished_notifications() == []
+    (nid,) = store.notification_ids()
+    n = store.get_notification(nid)
+    assert (n["state"], n["total"], n["sent"], n["failed"]) == ("done", 3, 3, 0)
+
+
+def test_export_roundtrip(open_store, tmp_path):
+    first = open_store("first")
+    run_import(first, DOC, tmp_path)
+    exported = io.StringIO()
+    export(first, exported)
+
+    second = open_store("second")
+    run_import(second, json.loads(exported.getvalue()), tmp_path)
+    again = io.StringIO()
+    export(second, again)
+    assert again.getvalue() == exported.getvalue()
@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+import time
+
+from storage import JournalStore, JsonStorage
+
+
+def plain(data):
+    return json.loads(json.dumps(data))
+
+
+def fill(store):
+    store.set(["roles", "1"], "admin")
+    store.set(["roles", "2"], "user")
+    store.set(["events"], [])
+    store.append(["events"], {"id": 1, "title": "Доклад"})
+    store.set(["questions", "1"], {"id": 1, "answer": None})
+    store.update(["questions", "1"], {"answer": "да"})
+    store.delete(["roles", "2"])
+
+
+def test_replay_restores_state(tmp_path):
+    path = str(tmp_path / "db.json")
+    store = JournalStore(path)
+    fill(store)
+    live = plain(store.data)
+    store.close()
+
+    reopened = JournalStore(path)
+    assert reopened.data == live
+    assert reopened.data["questions"]["1"]["answer"] == "да"
+    assert "2" not in reopened.data["roles"]
+    reopened.close()
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = str(tmp_path / "db.json")
+    store = JournalStore(path)
+    fill(store)
+    live = plain(store.data)
+    store.close()
+    with open(path + ".journal", "a", encoding="utf-8") as f:
+        f.write('{"seq": 99, "op": "set", "path": ["roles", "3"], "va')
+
+    reopened = JournalStore(path)
+    assert reopened.data == live
+    reopened.close()
+
+
+def test_compaction_writes_snapshot_and_drops_old_journal(tmp_path):
+    path = str(tmp_path / "db.json")
+    store = JournalStore(path, compact_every=10**9)
+    fill(store)
+    store.compact()
+    store.set(["roles", "4"], "speaker")
+    live = plain(store.data)
+    store.close()
+
+    assert not os.path.exists(path + ".journal.old")
+    with open(path, encoding="utf-8") as f:
+        assert "4" not in json.load(f)["roles"]
+    reopened = JournalStore(path)
+    assert reopened.data == live
+    reopened.close()
+
+
+def test_concurrent_compactions_lose_nothing(tmp_path):
+    # Фоновая компакция по счётчику и явные вызовы compact() одновременно с записью.
+    path = str(tmp_path / "db.json")
+    store = JsonStorage(path, compact_every=50)
+    stop = threading.Event()
+
+    def write(sender):
+        i = 0
+        while not stop.is_set() and i < 2000:
+            store.add_question({"from": sender, "to": 2, "question": f"{sender}-{i}", "answer": None,
+                                "created_at": i})
+            i += 1
+
+    def compact():
+        while not stop.is_set():
+            store.journal.compact()
+
+    writers = [threading.Thread(target=write, args=(k,)) for k in range(3)]
+    compactor = threading.Thread(target=compact)
+    for t in writers + [compactor]:
+        t.start()
+    for t in writers:
+        t.join()
+    stop.set()
+    compactor.join()
+    while store.journal._compacting:
+        time.sleep(0.01)
+    with store.journal.compact_lock:
+        live = plain(store.db)
+    store.close()
+
+    assert len(live["questions"]) == 6000
+    reopened = JsonStorage(path)
+    assert plain(reopened.db) == live
+    reopened.close()
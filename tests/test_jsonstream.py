@@ -0,0 +1,60 @@
+import io
+import json
+import random
+
+import pytest
+
+import jsonstream
+
+
+def stream_load(text, chunk_size):
+    data = {}
+    for key, kind, items in jsonstream.sections(io.StringIO(text), chunk_size):
+        data[key] = list(items) if kind == "list" else dict(items) if kind == "dict" else items
+    return data
+
+
+DOC = {
+    "users": [{"user_id": "u1", "full_name": "Анна \"Докер\" Иванова", "telegram_id": 95756,
+               "tags": ["[a]", "{b}", "c,d"], "score": 1.5e3, "active": True, "note": None}],
+    "events": [],
+    "settings": {"limit": -12.25, "title": "Конференция\n2025", "empty": {}},
+    "version": 3,
+    "name": "x\\y\u00e9",
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, jsonstream.CHUNK_SIZE])
+def test_sections_match_json_load(chunk_size):
+    for indent in (None, 2):
+        text = json.dumps(DOC, ensure_ascii=False, indent=indent)
+        assert stream_load(text, chunk_size) == json.loads(text)
+
+
+def test_random_documents():
+    rng = random.Random(5)
+
+    def value(depth):
+        kind = rng.randrange(7 if depth < 3 else 4)
+        if kind == 0:
+            return rng.randint(-10**6, 10**6)
+        if kind == 1:
+            return rng.random() * 10**rng.randint(-3, 8)
+        if kind == 2:
+            return "".join(rng.choice('ab ,:[]{}"\\ё\n') for _ in range(rng.randint(0, 12)))
+        if kind == 3:
+            return rng.choice([True, False, None])
+        if kind in (4, 5):
+            return [value(depth + 1) for _ in range(rng.randint(0, 4))]
+        return {f"k{i}": value(depth + 1) for i in range(rng.randint(0, 4))}
+
+    for _ in range(300):
+        doc = {f"s{i}": value(0) for i in range(rng.randint(1, 5))}
+        text = json.dumps(doc, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 1]))
+        assert stream_load(text, rng.randint(1, 16)) == json.loads(text)
+
+
+def test_unread_section_is_skipped():
+    text = json.dumps({"users": [{"a": 1}, {"b": [2, 3]}], "events": [{"c": 4}]})
+    seen = [(key, kind) for key, kind, _ in jsonstream.sections(io.StringIO(text), 4)]
+    assert seen == [("users", "list"), ("events", "list")]
@@ -0,0 +1,49 @@
+import time
+
+from ratelimit import SlidingWindow
+
+
+def test_limit_within_one_window():
+    w = SlidingWindow(limit=3, window=10)
+    assert [w.allow("a", now=100 + i) for i in range(4)] == [True, True, True, False]
+    assert w.allow("b", now=103)
+
+
+def test_previous_bucket_is_weighted():
+    w = SlidingWindow(limit=100, window=10)
+    for _ in range(10):
+        w.hit("a", now=101)
+    # Половина окна прошла: от прошлой корзины остаётся половина событий.
+    assert w.count("a", now=115) == 5
+    assert w.hit("a", now=115) == 6
+    # Через два окна прошлые события не считаются.
+    assert w.count("a", now=131) == 0
+
+
+def test_reset_forgets_key():
+    w = SlidingWindow(limit=1, window=10)
+    assert w.allow("a", now=100)
+    assert not w.allow("a", now=101)
+    w.reset("a")
+    assert w.allow("a", now=102)
+
+
+def test_maxsize_evicts_least_recent():
+    w = SlidingWindow(limit=5, window=10, maxsize=2)
+    w.hit("a", now=100)
+    w.hit("b", now=100)
+    w.hit("a", now=101)
+    w.hit("c", now=102)
+    assert len(w) == 2
+    assert w.count("b", now=102) == 0
+    assert w.count("a", now=102) == 2
+
+
+def test_sweep_drops_idle_keys():
+    w = SlidingWindow(limit=5, window=10)
+    # Очистка отсчитывается от time.monotonic() в момент создания.
+    base = time.monotonic() // 10 * 10
+    w.hit("idle", now=base + 100)
+    w.hit("busy", now=base + 125)
+    assert len(w) == 1
+    assert w.count("busy", now=base + 125) == 1
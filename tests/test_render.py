@@ -0,0 +1,65 @@
+import random
+
+from render import EscapedFields, escape_md, split_markdown, split_messages
+
+
+def balanced(text):
+    """Разметка как её видит parse_mode="Markdown": все сущности закрыты."""
+    entity, escaped = None, False
+    for i, ch in enumerate(text):
+        if escaped:
+            escaped = False
+        elif ch == "\\" and entity != "`" and text[i + 1:i + 2] in ("_", "*", "`", "["):
+            escaped = True
+        elif entity is None and ch in "*_`":
+            entity = ch
+        elif ch == entity:
+            entity = None
+    return entity is None
+
+
+def test_blocks_are_packed_up_to_limit():
+    chunks = split_messages("H\n", ["a" * 4, "b" * 4, "c" * 4], limit=10)
+    assert chunks == ["H\naaaabbbb", "cccc"]
+
+
+def test_short_text_is_not_split():
+    assert split_markdown("*Вопрос:* да", limit=100) == ["*Вопрос:* да"]
+
+
+def test_long_answer_keeps_markup_valid():
+    block = f"*Вопрос:* {escape_md('x_y*z ' * 40)}\n*Ответ:* {escape_md('ответ_* ' * 60)}\n\n"
+    chunks = split_messages("📨 *Ваши ответы:*\n\n", [block], limit=100)
+    assert all(len(c) <= 100 for c in chunks)
+    assert all(balanced(c) for c in chunks)
+
+
+def test_cut_never_separates_escape():
+    text = "\\_" * 50
+    for limit in range(5, 30):
+        pieces = split_markdown(text, limit)
+        assert "".join(pieces) == text
+        assert all(not p.endswith("\\") for p in pieces)
+
+
+def test_random_markdown_stays_balanced():
+    rng = random.Random(3)
+    strip = str.maketrans("", "", "*_`")
+    for _ in range(3000):
+        limit = rng.randint(8, 60)
+        parts = []
+        for _ in range(rng.randint(1, 30)):
+            word = escape_md("".join(rng.choice("ab _*`[\n") for _ in range(rng.randint(1, 15))))
+            parts.append(f"*{word}*" if rng.random() < 0.3 else word)
+        text = "".join(parts)
+        pieces = split_markdown(text, limit)
+        assert all(len(p) <= limit for p in pieces)
+        assert all(balanced(p) for p in pieces), (text, limit, pieces)
+        assert "".join(pieces).translate(strip) == text.translate(strip)
+
+
+def test_escaped_fields_follow_record_changes():
+    cache = EscapedFields(("question", "answer"))
+    assert cache.get(1, {"question": "a_b", "answer": None}) == {"question": "a\\_b", "answer": ""}
+    # Ответ изменили в другом процессе: put() здесь не вызывался.
+    assert cache.get(1, {"question": "a_b", "answer": "x*y"})["answer"] == "x\\*y"
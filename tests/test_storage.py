@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from storage import JsonStorage, SqliteStorage
+
+TEXTS = ["как собрать докер образ", "докера нет", "образ диска", "вопрос про ёлку", "Елка и докер", "привет"]
+
+
+@pytest.fixture
+def stores(tmp_path):
+    """Обе реализации, заполненные одинаково."""
+    rng = random.Random(7)
+    pair = [JsonStorage(str(tmp_path / "db.json")), SqliteStorage(str(tmp_path / "db.sqlite3"))]
+    for store in pair:
+        for uid in range(100, 125):
+            store.set_role(str(uid), "speaker" if uid % 5 == 0 else "user")
+            if uid % 5 == 0:
+                store.add_speaker(str(uid), f"Спикер {uid}")
+        for i in range(13):
+            store.add_event({"title": f"Событие {i}", "description": "", "speaker_id": "100",
+                             "speaker_name": "Спикер 100", "created_at": i})
+    for i in range(120):
+        question = {"from": rng.randint(100, 104), "to": rng.choice([100, 105, 110]),
+                    "question": f"{rng.choice(TEXTS)} {i}", "answer": None, "created_at": 1000 + i}
+        answered = rng.random() < 0.4
+        for store in pair:
+            qid = store.add_question(question)
+            if answered:
+                store.answer_question(qid, "ответ", 2000 + i)
+    for qid in (5, 50, 77):
+        for store in pair:
+            store.delete_question(qid)
+    yield pair
+    for store in pair:
+        store.close()
+
+
+def walk(store, kind, key, limit):
+    """Пройти список вперёд до конца и обратно до начала; все страницы с флагами."""
+    pages, cursor = [], None
+    while True:
+        items, has_prev, has_next = store.page(kind, after=cursor, limit=limit)
+        pages.append(([item[key] for item in items], has_prev, has_next))
+        if not has_next:
+            break
+        cursor = items[-1][key]
+    cursor = pages[-1][0][0]
+    while True:
+        items, has_prev, has_next = store.page(kind, before=cursor, limit=limit)
+        pages.append(([item[key] for item in items], has_prev, has_next))
+        if not has_prev:
+            break
+        cursor = items[0][key]
+    return pages
+
+
+@pytest.mark.parametrize("kind,key", [("users", "uid"), ("speakers", "uid"), ("events", "id"), ("questions", "id")])
+@pytest.mark.parametrize("limit", [1, 4, 10])
+def test_page_parity(stores, kind, key, limit):
+    json_store, sqlite_store = stores
+    assert walk(json_store, kind, key, limit) == walk(sqlite_store, kind, key, limit)
+
+
+def test_page_from_start(stores):
+    for start in ("0", "30", "76", "200"):
+        a, b = (s.page("questions", start=start, limit=5) for s in stores)
+        assert ([q["id"] for q in a[0]], a[1], a[2]) == ([q["id"] for q in b[0]], b[1], b[2])
+
+
+SEARCHES = [
+    {}, {"text": "докер"}, {"text": "докер образ"}, {"text": "елка"}, {"text": "обр"}, {"text": "нет такого"},
+    {"to": 105}, {"sender": 101, "answered": True}, {"answered": False}, {"text": "докер", "answered": False},
+    {"since": 1030, "until": 1060}, {"text": "образ", "to": 100, "since": 1010},
+]
+
+
+def search_all(store, params, limit):
+    """Листать поиск к старым до конца, затем назад к новым."""
+    pages, before = [], None
+    while True:
+        found, newer, older = store.search_questions(**params, before=before, limit=limit)
+        pages.append(([q["id"] for q in found], newer, older))
+        if not older:
+            break
+        before = found[-1]["id"]
+    after = pages[-1][0][0] if pages[-1][0] else None
+    while after is not None:
+        found, newer, older = store.search_questions(**params, after=after, limit=limit)
+        pages.append(([q["id"] for q in found], newer, older))
+        if not newer:
+            break
+        after = found[0]["id"]
+    return pages
+
+
+@pytest.mark.parametrize("params", SEARCHES)
+def test_search_parity(stores, params):
+    json_store, sqlite_store = stores
+    for limit in (3, 10):
+        assert search_all(json_store, params, limit) == search_all(sqlite_store, params, limit)
+
+
+def test_search_finds_expected(stores):
+    for store in stores:
+        found, _, _ = store.search_questions(text="ёлка", limit=200)
+        assert found and all("елк" in q["question"].lower().replace("ё", "е") for q in found)
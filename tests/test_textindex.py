@@ -0,0 +1,38 @@
+from textindex import InvertedIndex, words
+
+
+def test_words_normalizes_text():
+    assert words("Ёлка, ёлка и ДОКЕР!") == ["елка", "и", "докер"]
+    assert words(None) == []
+
+
+def test_prefix_search_requires_all_words():
+    index = InvertedIndex()
+    index.add(1, "Как собрать докер-образ?")
+    index.add(2, "Докера нет на сервере")
+    index.add(3, "Образ диска")
+    assert index.search("докер") == {1, 2}
+    assert index.search("докер образ") == {1}
+    assert index.search("обр") == {1, 3}
+    assert index.search("кубернетес") == set()
+    assert index.search("?!") is None
+
+
+def test_remove_drops_unused_words():
+    index = InvertedIndex()
+    index.add(1, "докер образ")
+    index.add(2, "докер")
+    index.remove(1, "докер образ")
+    assert index.search("докер") == {2}
+    assert index.search("образ") == set()
+    assert len(index) == 1
+
+
+def test_prefix_does_not_leak_into_neighbours():
+    index = InvertedIndex()
+    index.add(1, "abc")
+    index.add(2, "abd")
+    index.add(3, "ab")
+    assert index.search("abc") == {1}
+    assert index.search("ab") == {1, 2, 3}
+    assert index.search("abcd") == set()
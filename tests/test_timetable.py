@@ -0,0 +1,66 @@
+import random
+from datetime import datetime, timedelta
+
+from timetable import ScheduleIndex, to_ts
+
+BASE = datetime(2025, 11, 26, 9, 0)
+
+
+def talk(talk_id, start_min, end_min):
+    return {"talk_id": talk_id, "title": f"t{talk_id}",
+            "start_time": (BASE + timedelta(minutes=start_min)).isoformat(),
+            "end_time": (BASE + timedelta(minutes=end_min)).isoformat()}
+
+
+def linear_current(talks, now):
+    live = [t for t in talks if to_ts(t["start_time"]) <= now < to_ts(t["end_time"])]
+    return sorted(live, key=lambda t: (to_ts(t["start_time"]), t["talk_id"]))
+
+
+def linear_upcoming(talks, now, n):
+    later = [t for t in talks if to_ts(t["start_time"]) > now]
+    return sorted(later, key=lambda t: (to_ts(t["start_time"]), t["talk_id"]))[:n]
+
+
+def test_matches_linear_scan():
+    rng = random.Random(1)
+    for _ in range(200):
+        talks = []
+        for i in range(rng.randint(0, 60)):
+            start = rng.randint(0, 600)
+            length = rng.choice([1, 5, 30, 90]) if rng.random() < 0.9 else 5000
+            talks.append(talk(i + 1, start, start + length))
+        index = ScheduleIndex(talks)
+        for _ in range(30):
+            now = to_ts(BASE.isoformat()) + rng.randint(-10, 700) * 60 + rng.choice([0, 30])
+            assert index.current(now) == linear_current(talks, now)
+            assert index.upcoming(now, 3) == linear_upcoming(talks, now, 3)
+
+
+def test_long_talk_does_not_hide_others():
+    talks = [talk(1, 0, 10_000)] + [talk(i + 2, i * 10, i * 10 + 5) for i in range(100)]
+    index = ScheduleIndex(talks)
+    now = to_ts(BASE.isoformat()) + 502 * 60
+    assert [t["talk_id"] for t in index.current(now)] == [1, 52]
+
+
+def test_degenerate_talks_are_skipped():
+    # Нулевая длина и конец раньше начала — раньше _build уходил в бесконечную рекурсию.
+    talks = [talk(1, 60, 60), talk(2, 120, 30), talk(3, 0, 180)]
+    index = ScheduleIndex(talks)
+    now = to_ts(BASE.isoformat()) + 60 * 60
+    assert [t["talk_id"] for t in index.current(now)] == [3]
+    assert index.upcoming(to_ts(BASE.isoformat()) - 1) == [talks[2]]
+
+
+def test_only_degenerate_talks():
+    index = ScheduleIndex([talk(1, 60, 60)])
+    assert index.current(to_ts(BASE.isoformat()) + 60 * 60) == []
+    assert index.upcoming(0) == []
+
+
+def test_reload_replaces_talks_and_version():
+    index = ScheduleIndex([talk(1, 0, 60)], version=1)
+    index.reload([talk(2, 0, 60)], version=2)
+    assert index.version == 2
+    assert [t["talk_id"] for t in index.current(to_ts(BASE.isoformat()))] == [2]
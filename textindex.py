@@ -0,0 +1,67 @@
+import re
+from bisect import bisect_left, insort
+
+
+_WORD = re.compile(r"\w+")
+
+
+def words(text):
+    """Слова текста для поиска: нижний регистр, «ё» как «е», без повторов."""
+    return list(dict.fromkeys(_WORD.findall((text or "").lower().replace("ё", "е"))))
+
+
+class InvertedIndex:
+    """Инвертированный индекс: слово -> множество id документов.
+
+    Обновляется по одному документу (add/remove), без пересборки. Слова
+    запроса ищутся по префиксу («докер» находит «докера»): словарь держится
+    отсортированным, поэтому все слова с префиксом — один бинарный поиск
+    и проход по соседним ключам. Результат — документы со всеми словами.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._vocabulary = []
+
+    def add(self, doc_id, text):
+        for word in words(text):
+            ids = self._postings.get(word)
+            if ids is None:
+                ids = self._postings[word] = set()
+                insort(self._vocabulary, word)
+            ids.add(doc_id)
+
+    def remove(self, doc_id, text):
+        for word in words(text):
+            ids = self._postings.get(word)
+            if ids is None:
+                continue
+            ids.discard(doc_id)
+            if not ids:
+                del self._postings[word]
+                del self._vocabulary[bisect_left(self._vocabulary, word)]
+
+    def _prefixed(self, prefix):
+        i = bisect_left(self._vocabulary, prefix)
+        found = []
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(prefix):
+            found.append(self._postings[self._vocabulary[i]])
+            i += 1
+        return found[0] if len(found) == 1 else set().union(*found)
+
+    def search(self, query):
+        """id документов, где есть все слова запроса (None — в запросе нет слов).
+
+        Результат может быть внутренним множеством индекса: только для чтения.
+        """
+        result = None
+        # Сначала длинные слова: у них меньше совпадений, пересечение быстрее сужается.
+        for word in sorted(words(query), key=len, reverse=True):
+            ids = self._prefixed(word)
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result
+
+    def __len__(self):
+        return len(self._postings)
@@ -1,9 +1,29 @@
 import telebot
-from telebot import types
-import json
+from telebot import apihelper, types
 import time
+from collections import OrderedDict
+from datetime import datetime
 from dotenv import load_dotenv
+import argparse
 import os
+import signal
+import sys
+import threading
+
+from broadcast import Broadcaster
+from cluster import Leader
+from conversation import Conversations
+from markup import MarkupRegistry
+import metrics
+from metrics import timed
+from namecache import NameCache, display_name
+from outbox import Outbox
+from render import EscapedFields, RenderedList, escape_md, split_messages
+from ratelimit import FloodGuard, SlidingWindow
+from router import Router
+from timetable import ScheduleIndex, parse_time
+from webhook import UpdateWorkers, WebhookServer, raw_chat_id, raw_handler
+from storage import JsonStorage, SqliteStorage, migrate_json_to_sqlite, open_storage
 
 
 load_dotenv()
@@ -13,24 +33,80 @@ TOKEN = os.getenv("TOKEN")
 ADMIN_ID = int(os.getenv("ADMIN_ID"))
 SPEAKER_PASSWORD = os.getenv("SPEAKER_PASSWORD")
 
+apihelper.ENABLE_MIDDLEWARE = True
+if os.getenv("BOT_API_URL"):
+    apihelper.API_URL = os.environ["BOT_API_URL"]
+metrics.instrument_api(apihelper)
 bot = telebot.TeleBot(TOKEN)
 
 # --------------------- JSON ---------------------
 
 DB_PATH = os.getenv("DB_PATH")
+DB_COMPACT_EVERY = int(os.getenv("DB_COMPACT_EVERY", "1000"))
+DB_FLUSH_MODE = os.getenv("DB_FLUSH_MODE", "batched(100)")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "bot.sqlite3")
 
-def load_db():
-    try:
-        with open(DB_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {"roles": {}, "events": [], "speakers": {}, "questions": [], "password_attempts": {}}
+store = open_storage(STORAGE_BACKEND, DB_PATH, SQLITE_PATH, compact_every=DB_COMPACT_EVERY, flush_mode=DB_FLUSH_MODE)
+
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "30"))
+
+broadcaster = Broadcaster(bot, store, workers=BROADCAST_WORKERS, rate=BROADCAST_RATE)
+
+# Изменения программы (мероприятия, доклады) уходят одним дайджестом за окно.
+NOTIFY_WINDOW = int(os.getenv("NOTIFY_WINDOW", "60"))
+
+outbox = Outbox(store, broadcaster, window=NOTIFY_WINDOW)
+
+NAME_CACHE_SIZE = int(os.getenv("NAME_CACHE_SIZE", "10000"))
+NAME_CACHE_TTL = int(os.getenv("NAME_CACHE_TTL", "3600"))
+NAME_CACHE_NEGATIVE_TTL = int(os.getenv("NAME_CACHE_NEGATIVE_TTL", "60"))
+# По умолчанию — рядом с файлом базы того хранилища, что используется.
+NAME_CACHE_PATH = os.getenv("NAME_CACHE_PATH", f"{SQLITE_PATH if STORAGE_BACKEND == 'sqlite' else DB_PATH}.names.json")
+
+names = NameCache(NAME_CACHE_SIZE, NAME_CACHE_TTL, NAME_CACHE_NEGATIVE_TTL, path=NAME_CACHE_PATH)
+
+schedule = ScheduleIndex()
+
+def fresh_schedule():
+    """Индекс докладов; пересобирается, когда расписание в хранилище изменилось (в т.ч. другим процессом)."""
+    version = store.talks_version()
+    if version != schedule.version:
+        schedule.reload(store.talks(), version)
+    return schedule
+
+# Экранирование Markdown делается при записи; на чтение — только склейка готовых кусков.
+event_md = EscapedFields(("title", "description", "speaker_name"))
+answer_md = EscapedFields(("question", "answer"))
+
+def render_event(n, e):
+    md = event_md.get(e["id"], e)
+    return f"*{n}. {md['title']}*\n{md['description']}\n🎤 Спикер: {md['speaker_name']}\n\n"
+
+events_view = RenderedList(store.events, store.events_version, render_event, header="📅 *Мероприятия:*\n\n")
+
+CONVERSATION_TTL = int(os.getenv("CONVERSATION_TTL", "1800"))
+CONVERSATION_MAX = int(os.getenv("CONVERSATION_MAX", "100000"))
 
-def save_db():
-    with open(DB_PATH, "w", encoding="utf-8") as f:
-        json.dump(db, f, indent=4, ensure_ascii=False)
+conversations = Conversations(store, ttl=CONVERSATION_TTL, maxsize=CONVERSATION_MAX, wrap=timed)
 
-db = load_db()
+FLOOD_USER_LIMIT = int(os.getenv("FLOOD_USER_LIMIT", "20"))
+FLOOD_CHAT_LIMIT = int(os.getenv("FLOOD_CHAT_LIMIT", "30"))
+FLOOD_WINDOW = int(os.getenv("FLOOD_WINDOW", "10"))
+
+flood = FloodGuard(bot, FLOOD_USER_LIMIT, FLOOD_CHAT_LIMIT, FLOOD_WINDOW, exempt=[ADMIN_ID])
+
+# Порядок регистрации важен: сначала защита от флуда, затем незавершённые
+# диалоги, роутер (кнопки и callback'и — одним поиском в словаре), и только
+# потом фильтры telebot для команд и «Назад».
+flood.attach(bot)
+conversations.attach(bot)
+router = Router(wrap=timed)
+router.attach(bot)
+
+metrics.DB_SIZE_BYTES.set_function(store.size_bytes)
+metrics.CONVERSATIONS_PENDING.set_function(store.conversation_count)
 
 # --------------------- HELPERS ---------------------
 
@@ -40,109 +116,128 @@ def is_back(text):
     return isinstance(text, str) and text.strip() in BACK_KEYS
 
 def set_role(uid, role):
-    db["roles"][str(uid)] = role
-    save_db()
+    store.set_role(uid, role)
 
 def remove_user(uid):
     """Полное удаление пользователя из базы (roles, speakers, questions as from/to)."""
-    uid_s = str(uid)
-    db.get("roles", {}).pop(uid_s, None)
-    db.get("speakers", {}).pop(uid_s, None)
-    db["questions"] = [q for q in db.get("questions", []) if q.get("from") != int(uid) and q.get("to") != int(uid)]
-    save_db()
+    store.remove_user(uid)
 
 def get_role(uid):
-    return db["roles"].get(str(uid), "user")
+    return store.get_role(uid) or "user"
 
 def register_speaker(uid, name):
-    db.setdefault("speakers", {})[str(uid)] = name
-    save_db()
+    store.add_speaker(uid, name)
 
 def safe_username(uid):
+    name = names.get(uid)
+    if name is not None:
+        return name
     try:
-        ch = bot.get_chat(int(uid))
-        if getattr(ch, "username", None):
-            return f"@{ch.username}"
-        return getattr(ch, "first_name", None) or f"id{uid}"
+        name = display_name(bot.get_chat(int(uid)))
     except Exception:
+        names.put(uid, f"id{uid}", negative=True)
         return f"id{uid}"
+    names.put(uid, name)
+    return name
+
+
+@bot.middleware_handler(update_types=["message", "callback_query"])
+def remember_sender(bot_instance, update):
+    names.remember(update.from_user)
+
+def send_chunks(chat_id, chunks, reply_markup=None, parse_mode="Markdown"):
+    """Отправить длинный текст несколькими сообщениями; клавиатура — у последнего."""
+    for i, chunk in enumerate(chunks, 1):
+        bot.send_message(chat_id, chunk, parse_mode=parse_mode, reply_markup=reply_markup if i == len(chunks) else None)
 
 def send_main_menu(chat_id, user_id):
     role = get_role(user_id)
     bot.send_message(chat_id, f"Меню обновлено. Ваша роль: *{role}*", parse_mode="Markdown", reply_markup=get_menu(role))
 
 
-def notify_all(text, exclude=None):
-    """Рассылка всем пользователям (кроме исключённого ID)."""
-    for uid in list(db.get("roles", {}).keys()):
-        if str(uid) == str(exclude):
-            continue
-        try:
-            bot.send_message(int(uid), text, parse_mode="Markdown")
-        except Exception:
-            pass
+def notify_all(text, exclude=None, report_to=None):
+    """Фоновая рассылка всем пользователям (кроме исключённого ID и заблокировавших бота)."""
+    blocked = store.blocked_users()
+    recipients = [uid for uid in store.user_ids() if uid != str(exclude) and uid not in blocked]
+    return broadcaster.start(text, recipients, parse_mode="Markdown", report_to=report_to)
 
 
+@conversations.step
 def send_broadcast_message(message):
     text = message.text
-    notify_all(f"Сообщение от организатора:\n\n{text}", exclude=message.from_user.id)
-    bot.send_message(message.chat.id, "✅ Рассылка отправлена!")
+    notify_all(f"Сообщение от организатора:\n\n{text}", exclude=message.from_user.id, report_to=message.chat.id)
 
 
 def get_current_speaker():
-    now = int(time.time())
-    for e in db["events"]:
-        if e["start_time"] <= now <= e["end_time"]:
-            return e["speaker_id"], e["title"]
-    return None, None
+    live = fresh_schedule().current(time.time())
+    if not live:
+        return None, None
+    return live[0]["speaker_id"], live[0]["title"]
 
 
 # --------------------- MENUS ---------------------
 
+markups = MarkupRegistry()
+
+@markups.static("menu_user")
 def menu_user():
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
     kb.add("📅 Посмотреть мероприятия")
     kb.add("❓ Задать вопрос спикеру")
+    kb.add("⏭ Расписание")
     kb.add("📨 Мои ответы")
     kb.add("🎤 Стать спикером")
+    kb.add("🔔 Уведомления")
     kb.add("🔙 Назад")
     return kb
 
+@markups.static("menu_speaker")
 def menu_speaker():
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
     kb.add("➕ Создать мероприятие")
+    kb.add("🗓 Добавить доклад")
     kb.add("📅 Посмотреть мероприятия")
+    kb.add("⏭ Расписание")
     kb.add("📨 Мои вопросы")
+    kb.add("🔎 Поиск вопросов")
+    kb.add("🔔 Уведомления")
     kb.add("🔙 Назад")
     return kb
 
+@markups.static("menu_admin")
 def menu_admin():
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
     kb.add("➕ Создать мероприятие")
+    kb.add("🗓 Добавить доклад")
     kb.add("📅 Посмотреть мероприятия")
+    kb.add("⏭ Расписание")
     kb.add("🔧 Админ-панель")
+    kb.add("🔎 Поиск вопросов")
+    kb.add("🔔 Уведомления")
     kb.add("🔙 Назад")
     return kb
 
 def get_menu(role):
     if role == "admin":
-        return menu_admin()
+        return markups.get("menu_admin")
     if role == "speaker":
-        return menu_speaker()
-    return menu_user()
+        return markups.get("menu_speaker")
+    return markups.get("menu_user")
 
 # --------------------- START ---------------------
 
 @bot.message_handler(commands=["start"])
+@timed
 def start(message):
     uid = str(message.from_user.id)
-    if uid not in db["roles"]:
-        db["roles"][uid] = "admin" if message.from_user.id == ADMIN_ID else "user"
-        save_db()
+    if store.get_role(uid) is None:
+        set_role(uid, "admin" if message.from_user.id == ADMIN_ID else "user")
+    store.unmark_blocked(uid)
     send_main_menu(message.chat.id, message.from_user.id)
 
 
 @bot.message_handler(func=lambda m: is_back(m.text))
+@timed
 def handle_back(message):
 
     send_main_menu(message.chat.id, message.from_user.id)
@@ -150,122 +245,275 @@ def handle_back(message):
 # --------------------- BECOME SPEAKER ---------------------
 
 MAX_TRIES = 3
-BLOCK_SECONDS = 300  
+BLOCK_SECONDS = 300
 
-@bot.message_handler(func=lambda m: m.text == "🎤 Стать спикером")
+# Неверные попытки считаются в памяти; в базу попадает только сама блокировка.
+password_tries = SlidingWindow(MAX_TRIES, BLOCK_SECONDS)
+
+@router.text("🎤 Стать спикером")
 def req_speaker(message):
     uid = str(message.from_user.id)
-    db.setdefault("password_attempts", {})
-    db["password_attempts"].setdefault(uid, {"tries": 0})
-    attempts = db["password_attempts"][uid]
+    attempts = store.get_attempts(uid)
 
     if attempts.get("blocked_until", 0) > time.time():
         wait = int(attempts["blocked_until"] - time.time())
         return bot.send_message(message.chat.id, f"⛔ Блокировка. Попробуйте через {wait} сек.")
     bot.send_message(message.chat.id, "Введите пароль спикера (или 🔙 Назад):")
-    bot.register_next_step_handler(message, check_speaker_password)
+    conversations.expect(message.chat.id, check_speaker_password)
 
+@conversations.step
 def check_speaker_password(message):
     if is_back(message.text):
         return send_main_menu(message.chat.id, message.from_user.id)
 
     uid = str(message.from_user.id)
-    attempts = db.setdefault("password_attempts", {}).setdefault(uid, {"tries": 0})
 
     if message.text == SPEAKER_PASSWORD:
         set_role(uid, "speaker")
         register_speaker(uid, message.from_user.first_name)
-        db["password_attempts"][uid] = {"tries": 0}
-        save_db()
+        password_tries.reset(uid)
+        if "blocked_until" in store.get_attempts(uid):
+            store.delete_attempts(uid)
         return bot.send_message(message.chat.id, "🎤 Вы стали спикером!", reply_markup=get_menu("speaker"))
 
-    attempts["tries"] = attempts.get("tries", 0) + 1
-    if attempts["tries"] >= MAX_TRIES:
-        attempts["blocked_until"] = time.time() + BLOCK_SECONDS
-        save_db()
+    tries = password_tries.hit(uid)
+    if tries >= MAX_TRIES:
+        password_tries.reset(uid)
+        store.expire_attempts(time.time())
+        store.set_attempts(uid, {"tries": tries, "blocked_until": time.time() + BLOCK_SECONDS})
         return bot.send_message(message.chat.id, f"⛔ Неверно {MAX_TRIES} раз. Блокировка {BLOCK_SECONDS // 60} минут.")
-    save_db()
-    bot.send_message(message.chat.id, f"❌ Неверно! Осталось попыток: {MAX_TRIES - attempts['tries']}\nПопробуйте снова или нажмите 🔙 Назад.")
-    bot.register_next_step_handler(message, check_speaker_password)
+    bot.send_message(message.chat.id, f"❌ Неверно! Осталось попыток: {MAX_TRIES - tries}\nПопробуйте снова или нажмите 🔙 Назад.")
+    conversations.expect(message.chat.id, check_speaker_password)
+
+# --------------------- NOTIFICATIONS ---------------------
+
+@router.text("🔔 Уведомления")
+def toggle_notifications(message):
+    enabled = not store.notifications_enabled(message.from_user.id)
+    store.set_notifications_enabled(message.from_user.id, enabled)
+    text = ("🔔 Уведомления об изменениях программы включены." if enabled else
+            "🔕 Уведомления об изменениях программы отключены. Сообщения организатора будут приходить по-прежнему.")
+    bot.send_message(message.chat.id, text, reply_markup=get_menu(get_role(message.from_user.id)))
 
 # --------------------- CREATE EVENT ---------------------
 
-@bot.message_handler(func=lambda m: m.text == "➕ Создать мероприятие")
+@router.text("➕ Создать мероприятие")
 def create_event_step1(message):
     if get_role(message.from_user.id) not in ("speaker", "admin"):
         return bot.send_message(message.chat.id, "⛔ Только спикер/админ.")
     bot.send_message(message.chat.id, "Введите название мероприятия (или 🔙 Назад):")
-    bot.register_next_step_handler(message, create_event_step2)
+    conversations.expect(message.chat.id, create_event_step2)
 
+@conversations.step
 def create_event_step2(message):
     if is_back(message.text):
         return send_main_menu(message.chat.id, message.from_user.id)
     title = message.text
     bot.send_message(message.chat.id, "Введите описание мероприятия (или 🔙 Назад):")
-    bot.register_next_step_handler(message, create_event_step3, title)
+    conversations.expect(message.chat.id, create_event_step3, title)
 
+@conversations.step
 def create_event_step3(message, title):
     if is_back(message.text):
         return send_main_menu(message.chat.id, message.from_user.id)
     description = message.text
     uid = str(message.from_user.id)
-    db.setdefault("events", []).append({
+    event = {
         "title": title,
         "description": description,
         "speaker_id": uid,
-        "speaker_name": db.get("speakers", {}).get(uid, message.from_user.first_name),
+        "speaker_name": store.speaker_name(uid) or message.from_user.first_name,
         "created_at": int(time.time())
-    })
-    save_db()
+    }
+    event_id = store.add_event(event)
+    md = event_md.put(event_id, event)
     bot.send_message(message.chat.id, "✔ Мероприятие создано!", reply_markup=get_menu(get_role(message.from_user.id)))
-    notify_all(f"Новое мероприятие добавлено!\n\n*{title}*\n{description}", exclude=message.from_user.id)
+    outbox.event_created(event_id, f"🆕 Новое мероприятие: *{md['title']}*\n{md['description']}", exclude=uid)
 
 # --------------------- EVENTS LIST ---------------------
 
-@bot.message_handler(func=lambda m: m.text == "📅 Посмотреть мероприятия")
+@router.text("📅 Посмотреть мероприятия")
 def show_events(message):
-    events = db.get("events", [])
-    if not events:
+    chunks = events_view.messages()
+    if not chunks:
         return bot.send_message(message.chat.id, "Нет мероприятий.", reply_markup=get_menu(get_role(message.from_user.id)))
-    txt = "📅 *Мероприятия:*\n\n"
-    for i, e in enumerate(events, 1):
-        txt += f"*{i}. {e['title']}*\n{e['description']}\n🎤 Спикер: {e.get('speaker_name')}\n\n"
+    send_chunks(message.chat.id, chunks, reply_markup=get_menu(get_role(message.from_user.id)))
+
+# --------------------- SCHEDULE ---------------------
+
+def format_talk(t):
+    start, end = parse_time(t["start_time"]), parse_time(t["end_time"])
+    speaker = escape_md(store.speaker_name(t["speaker_id"]) or t["speaker_id"])
+    return f"{start:%d.%m %H:%M}–{end:%H:%M} *{escape_md(t['title'])}*\n🎤 {speaker}"
+
+@router.text("⏭ Расписание")
+def show_schedule(message):
+    now = time.time()
+    index = fresh_schedule()
+    live, upcoming = index.current(now), index.upcoming(now, 5)
+    if not live and not upcoming:
+        return bot.send_message(message.chat.id, "В расписании пока ничего нет.", reply_markup=get_menu(get_role(message.from_user.id)))
+    txt = ""
+    if live:
+        txt += "🔴 *Сейчас идёт:*\n\n" + "\n\n".join(format_talk(t) for t in live) + "\n\n"
+    if upcoming:
+        txt += "⏭ *Дальше:*\n\n" + "\n\n".join(format_talk(t) for t in upcoming)
     bot.send_message(message.chat.id, txt, parse_mode="Markdown", reply_markup=get_menu(get_role(message.from_user.id)))
 
+# kind -> (текст над списком, (текст кнопки, callback_data) для элемента и мероприятия, поле-курсор)
+TALK_PICKERS = {
+    "events": ("Выберите мероприятие для доклада:", lambda e, _: (e["title"], f"talk_event_{e['id']}"), "id"),
+    "speakers": ("Кто выступает?", lambda s, event_id: (s["name"], f"talk_speaker_{event_id}_{s['uid']}"), "uid"),
+}
+
+def build_talk_picker(kind, event_id=0, after=None, before=None):
+    """Страница выбора мероприятия или спикера для доклада — постранично, как списки админки."""
+    _, button, key = TALK_PICKERS[kind]
+    items, has_prev, has_next = store.page(kind, after=after, before=before, limit=ADMIN_PAGE_SIZE)
+    if not items and has_prev:
+        items, has_prev, has_next = store.page(kind, before=after, limit=ADMIN_PAGE_SIZE)
+    if not items:
+        return None
+    kb = types.InlineKeyboardMarkup()
+    for item in items:
+        text, data = button(item, event_id)
+        kb.add(types.InlineKeyboardButton(text, callback_data=data))
+    nav = []
+    if has_prev:
+        nav.append(types.InlineKeyboardButton("◀️", callback_data=f"tpg_{kind}_{event_id}_b_{items[0][key]}"))
+    if has_next:
+        nav.append(types.InlineKeyboardButton("▶️", callback_data=f"tpg_{kind}_{event_id}_a_{items[-1][key]}"))
+    if nav:
+        kb.row(*nav)
+    return kb
+
+@router.text("🗓 Добавить доклад")
+def add_talk_start(message):
+    if get_role(message.from_user.id) not in ("speaker", "admin"):
+        return bot.send_message(message.chat.id, "⛔ Только спикер/админ.")
+    kb = build_talk_picker("events")
+    if kb is None:
+        return bot.send_message(message.chat.id, "Сначала создайте мероприятие.")
+    bot.send_message(message.chat.id, TALK_PICKERS["events"][0], reply_markup=kb)
+
+@router.callback("tpg_")
+def add_talk_page(call):
+    _, kind, event_id, direction, cursor = call.data.split("_", 4)
+    role = get_role(call.from_user.id)
+    if kind not in TALK_PICKERS or role not in ("speaker", "admin") or (kind == "speakers" and role != "admin"):
+        return bot.answer_callback_query(call.id, "Нет прав.")
+    kb = build_talk_picker(kind, int(event_id), **{"after" if direction == "a" else "before": cursor})
+    if kb is None:
+        return bot.answer_callback_query(call.id, "Список пуст.")
+    bot.edit_message_text(TALK_PICKERS[kind][0], chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
+
+@router.callback("talk_event_")
+def add_talk_event(call):
+    event_id = int(call.data.split("_", 2)[2])
+    role = get_role(call.from_user.id)
+    if role not in ("speaker", "admin"):
+        return bot.answer_callback_query(call.id, "Нет прав.")
+    if role == "admin":
+        kb = build_talk_picker("speakers", event_id)
+        if kb is None:
+            return bot.answer_callback_query(call.id, "Нет спикеров.")
+        return bot.edit_message_text(TALK_PICKERS["speakers"][0], chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
+    bot.send_message(call.message.chat.id, "Введите название доклада (или 🔙 Назад):")
+    conversations.expect(call.message.chat.id, add_talk_title, event_id, str(call.from_user.id))
+
+@router.callback("talk_speaker_")
+def add_talk_speaker(call):
+    if get_role(call.from_user.id) != "admin":
+        return bot.answer_callback_query(call.id, "Нет прав.")
+    _, _, event_id, speaker_id = call.data.split("_", 3)
+    bot.send_message(call.message.chat.id, "Введите название доклада (или 🔙 Назад):")
+    conversations.expect(call.message.chat.id, add_talk_title, int(event_id), speaker_id)
+
+@conversations.step
+def add_talk_title(message, event_id, speaker_id):
+    if is_back(message.text):
+        return send_main_menu(message.chat.id, message.from_user.id)
+    bot.send_message(message.chat.id, "Начало доклада в формате ГГГГ-ММ-ДД ЧЧ:ММ (или 🔙 Назад):")
+    conversations.expect(message.chat.id, add_talk_start_time, event_id, speaker_id, message.text)
+
+@conversations.step
+def add_talk_start_time(message, event_id, speaker_id, title):
+    if is_back(message.text):
+        return send_main_menu(message.chat.id, message.from_user.id)
+    try:
+        start = parse_time(message.text)
+    except ValueError:
+        bot.send_message(message.chat.id, "❌ Не понял время. Пример: 2025-11-26 10:00")
+        return conversations.expect(message.chat.id, add_talk_start_time, event_id, speaker_id, title)
+    bot.send_message(message.chat.id, "Окончание доклада (ЧЧ:ММ или ГГГГ-ММ-ДД ЧЧ:ММ):")
+    conversations.expect(message.chat.id, add_talk_finish, event_id, speaker_id, title, start.isoformat())
+
+@conversations.step
+def add_talk_finish(message, event_id, speaker_id, title, start_iso):
+    if is_back(message.text):
+        return send_main_menu(message.chat.id, message.from_user.id)
+    start = parse_time(start_iso)
+    try:
+        end = parse_time(message.text, base=start)
+    except ValueError:
+        end = None
+    if end is None or end <= start:
+        bot.send_message(message.chat.id, "❌ Окончание должно быть позже начала. Пример: 11:00")
+        return conversations.expect(message.chat.id, add_talk_finish, event_id, speaker_id, title, start_iso)
+    talk = store.add_talk(event_id, {"speaker_id": speaker_id, "title": title,
+                                     "start_time": start.isoformat(), "end_time": end.isoformat()})
+    if talk is None:
+        return bot.send_message(message.chat.id, "Мероприятие уже удалено.", reply_markup=get_menu(get_role(message.from_user.id)))
+    bot.send_message(message.chat.id, "✔ Доклад добавлен в расписание!", reply_markup=get_menu(get_role(message.from_user.id)))
+    event = store.get_event(event_id)
+    speaker = escape_md(store.speaker_name(speaker_id) or speaker_id)
+    outbox.talk_added(event_id, f"🗓 Доклад «{escape_md(title)}» — {event_md.get(event_id, event)['title']}\n"
+                                f"{start:%d.%m %H:%M}–{end:%H:%M}, 🎤 {speaker}", exclude=message.from_user.id)
+
 # --------------------- USER QUESTIONS ---------------------
 
-@bot.message_handler(func=lambda m: m.text == "❓ Задать вопрос спикеру")
+@router.text("❓ Задать вопрос спикеру")
 def choose_speaker(message):
-    speakers = db.get("speakers", {})
-    if not speakers:
+    speaker_id, talk_title = get_current_speaker()
+    kb = markups.get("speaker_picker", version=(store.speakers_version(), speaker_id, talk_title),
+                     build=lambda: build_speaker_picker(speaker_id, talk_title))
+    if kb is None:
         return bot.send_message(message.chat.id, "Нет спикеров.", reply_markup=get_menu(get_role(message.from_user.id)))
+    bot.send_message(message.chat.id, "Выберите спикера:", reply_markup=kb)
+
+def build_speaker_picker(speaker_id, talk_title):
+    speakers = store.speakers()
+    if not speakers:
+        return None
     kb = types.InlineKeyboardMarkup()
+    if speaker_id is not None:
+        kb.add(types.InlineKeyboardButton(f"🔴 Сейчас на сцене: {speakers.get(speaker_id, talk_title)}", callback_data=f"ask_{speaker_id}"))
     for uid, name in speakers.items():
         kb.add(types.InlineKeyboardButton(name, callback_data=f"ask_{uid}"))
     kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="ask_back"))
-    bot.send_message(message.chat.id, "Выберите спикера:", reply_markup=kb)
+    return kb
 
-@bot.callback_query_handler(func=lambda c: c.data == "ask_back")
+@router.callback("ask_back")
 def ask_back(call):
     send_main_menu(call.message.chat.id, call.from_user.id)
 
-@bot.callback_query_handler(func=lambda c: c.data.startswith("ask_"))
+@router.callback("ask_")
 def ask_question_start(call):
     speaker_id = call.data.split("_", 1)[1]
     bot.send_message(call.message.chat.id, "Введите вопрос (или 🔙 Назад):")
-    bot.register_next_step_handler(call.message, send_question_to_speaker, speaker_id)
+    conversations.expect(call.message.chat.id, send_question_to_speaker, speaker_id)
 
+@conversations.step
 def send_question_to_speaker(message, speaker_id):
     if is_back(message.text):
         return send_main_menu(message.chat.id, message.from_user.id)
-    db.setdefault("questions", []).append({
+    store.add_question({
         "from": message.from_user.id,
         "to": int(speaker_id),
         "question": message.text,
         "answer": None,
         "created_at": int(time.time())
     })
-    save_db()
     try:
         bot.send_message(int(speaker_id), f"❓ Новый вопрос от {safe_username(message.from_user.id)}:\n\n{message.text}")
     except Exception:
@@ -274,38 +522,38 @@ def send_question_to_speaker(message, speaker_id):
 
 # --------------------- SPEAKER QUESTIONS ---------------------
 
-@bot.message_handler(func=lambda m: m.text == "📨 Мои вопросы")
+@router.text("📨 Мои вопросы")
 def speaker_questions(message):
     uid = message.from_user.id
-    qs = [q for q in db.get("questions", []) if q["to"] == uid]
+    qs = store.questions_to(uid)
     if not qs:
         return bot.send_message(message.chat.id, "У вас нет вопросов.", reply_markup=get_menu(get_role(uid)))
     kb = types.InlineKeyboardMarkup()
-    for idx, q in enumerate(qs):
-        kb.add(types.InlineKeyboardButton(f"{'✅' if q.get('answer') else '❓'} Вопрос #{idx+1}", callback_data=f"answer_{idx}"))
+    for q in qs:
+        kb.add(types.InlineKeyboardButton(f"{'✅' if q.get('answer') else '❓'} Вопрос #{q['id']}", callback_data=f"answer_{q['id']}"))
     kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="speaker_questions_back"))
     bot.send_message(message.chat.id, "Ваши вопросы:", reply_markup=kb)
 
-@bot.callback_query_handler(func=lambda c: c.data == "speaker_questions_back")
+@router.callback("speaker_questions_back")
 def speaker_questions_back(call):
     send_main_menu(call.message.chat.id, call.from_user.id)
 
-@bot.callback_query_handler(func=lambda c: c.data.startswith("answer_"))
+@router.callback("answer_")
 def answer_question_start(call):
-    idx = int(call.data.split("_", 1)[1])
-    qs = [q for q in db.get("questions", []) if q["to"] == call.from_user.id]
-    if idx < 0 or idx >= len(qs):
-        return bot.answer_callback_query(call.id, "Неверный индекс.")
-    q = qs[idx]
+    q = store.get_question(int(call.data.split("_", 1)[1]))
+    if q is None or q["to"] != call.from_user.id:
+        return bot.answer_callback_query(call.id, "Вопрос не найден.")
     bot.send_message(call.message.chat.id, f"Вопрос:\n{q['question']}\nВведите ответ (или 🔙 Назад):")
-    bot.register_next_step_handler(call.message, answer_question_finish, q)
+    conversations.expect(call.message.chat.id, answer_question_finish, q["id"])
 
-def answer_question_finish(message, q):
+@conversations.step
+def answer_question_finish(message, qid):
     if is_back(message.text):
         return send_main_menu(message.chat.id, message.from_user.id)
-    q["answer"] = message.text
-    q["answered_at"] = int(time.time())
-    save_db()
+    q = store.answer_question(qid, message.text, int(time.time()))
+    if q is None:
+        return bot.send_message(message.chat.id, "Вопрос уже удалён.", reply_markup=get_menu(get_role(message.from_user.id)))
+    answer_md.put(qid, q)
     try:
         bot.send_message(q["from"], f"💬 Ответ спикера:\n\n{q['answer']}")
     except Exception:
@@ -314,19 +562,149 @@ def answer_question_finish(message, q):
 
 # --------------------- USER ANSWERS ---------------------
 
-@bot.message_handler(func=lambda m: m.text == "📨 Мои ответы")
+@router.text("📨 Мои ответы")
 def user_answers(message):
     uid = message.from_user.id
-    ans = [q for q in db.get("questions", []) if q["from"] == uid and q.get("answer")]
+    ans = store.questions_from(uid, answered=True)
     if not ans:
         return bot.send_message(message.chat.id, "У вас нет ответов.", reply_markup=get_menu(get_role(uid)))
-    txt = "📨 *Ваши ответы:*\n\n"
+    blocks = []
     for q in ans:
-        txt += f"*Вопрос:* {q['question']}\n*Ответ:* {q['answer']}\n\n"
-    bot.send_message(message.chat.id, txt, parse_mode="Markdown", reply_markup=get_menu(get_role(uid)))
+        md = answer_md.get(q["id"], q)
+        blocks.append(f"*Вопрос:* {md['question']}\n*Ответ:* {md['answer']}\n\n")
+    send_chunks(message.chat.id, split_messages("📨 *Ваши ответы:*\n\n", blocks), reply_markup=get_menu(get_role(uid)))
+
+# --------------------- QUESTION SEARCH ---------------------
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "5"))
+SEARCH_SNIPPET = 200
+
+SEARCH_HELP = ("Введите слова из вопроса (или 🔙 Назад). Фильтры можно добавить к словам:\n"
+               "от:ID — от кого, отвечен:да/нет, с:2025-11-26, до:2025-11-27 10:00"
+               "{admin}\nПример: докер отвечен:нет с:2025-11-26")
+
+# Последний поиск каждого чата — для кнопок листания (callback_data не вмещает запрос).
+searches = OrderedDict()
+searches_lock = threading.Lock()
+SEARCHES_MAX = 10_000
+
+def search_scope(uid):
+    """Чьи вопросы можно искать: все (None) — админу, свои — спикеру; False — никакие."""
+    if int(uid) == ADMIN_ID:
+        return None
+    return int(uid) if get_role(uid) == "speaker" else False
+
+def parse_search(text, admin):
+    """'докер от:123 отвечен:нет' -> параметры store.search_questions; ValueError с пояснением."""
+    params, plain = {}, []
+    parts = text.split()
+    i = 0
+    while i < len(parts):
+        key, sep, value = parts[i].partition(":")
+        key = key.lower()
+        if not sep or key not in ("от", "спикер", "отвечен", "с", "до"):
+            plain.append(parts[i])
+        elif key == "отвечен":
+            if value.lower() not in ("да", "нет"):
+                raise ValueError("отвечен: — да или нет")
+            params["answered"] = value.lower() == "да"
+        elif key in ("от", "спикер"):
+            if key == "спикер" and not admin:
+                raise ValueError("фильтр спикер: доступен только админу")
+            if not value.isdigit():
+                raise ValueError(f"{key}: — числовой ID")
+            params["sender" if key == "от" else "to"] = int(value)
+        else:
+            # Дата может идти со временем через пробел: «с:2025-11-26 10:00».
+            if i + 1 < len(parts) and ":" in parts[i + 1] and parts[i + 1].replace(":", "").isdigit():
+                value, i = f"{value} {parts[i + 1]}", i + 1
+            try:
+                params["since" if key == "с" else "until"] = int(datetime.fromisoformat(value).timestamp())
+            except ValueError:
+                raise ValueError(f"{key}: — дата ГГГГ-ММ-ДД или ГГГГ-ММ-ДД ЧЧ:ММ") from None
+        i += 1
+    params["text"] = " ".join(plain)
+    return params
+
+def build_search_page(chat_id, after=None, before=None):
+    with searches_lock:
+        params = searches.get(chat_id)
+    if params is None:
+        return "Поиск устарел — повторите его.", None
+    admin = int(chat_id) == ADMIN_ID
+    items, has_newer, has_older = store.search_questions(**params, after=after, before=before, limit=SEARCH_PAGE_SIZE)
+    if not items:
+        return ("Ничего не найдено." if after is None and before is None else "Больше ничего нет."), None
+    blocks, kb = [], types.InlineKeyboardMarkup()
+    for q in items:
+        when = datetime.fromtimestamp(q["created_at"]).strftime("%d.%m %H:%M") if q.get("created_at") else "—"
+        who = safe_username(q["from"]) + (f" → {safe_username(q['to'])}" if admin else "")
+        snippet = q["question"] if len(q["question"]) <= SEARCH_SNIPPET else q["question"][:SEARCH_SNIPPET] + "…"
+        blocks.append(f"{'✅' if q.get('answer') else '❓'} #{q['id']} · {when} · {who}\n{snippet}")
+        kb.add(types.InlineKeyboardButton(f"{'Открыть' if admin else '✍️ Ответить'} #{q['id']}",
+                                          callback_data=f"q_{q['id']}" if admin else f"answer_{q['id']}"))
+    nav = []
+    if has_newer:
+        nav.append(types.InlineKeyboardButton("◀️ Новее", callback_data=f"qs_a_{items[0]['id']}"))
+    if has_older:
+        nav.append(types.InlineKeyboardButton("Старше ▶️", callback_data=f"qs_b_{items[-1]['id']}"))
+    if nav:
+        kb.row(*nav)
+    return "🔎 Найдено:\n\n" + "\n\n".join(blocks), kb
+
+def run_search(message, text):
+    scope = search_scope(message.from_user.id)
+    try:
+        params = parse_search(text, admin=scope is None)
+    except ValueError as e:
+        bot.send_message(message.chat.id, f"❌ {e}. Попробуйте снова или нажмите 🔙 Назад.")
+        return conversations.expect(message.chat.id, search_questions_step)
+    if scope is not None:
+        params["to"] = scope
+    with searches_lock:
+        searches[message.chat.id] = params
+        searches.move_to_end(message.chat.id)
+        while len(searches) > SEARCHES_MAX:
+            searches.popitem(last=False)
+    text, kb = build_search_page(message.chat.id)
+    bot.send_message(message.chat.id, text, reply_markup=kb)
+
+@router.text("🔎 Поиск вопросов")
+def search_questions_start(message):
+    scope = search_scope(message.from_user.id)
+    if scope is False:
+        return bot.send_message(message.chat.id, "⛔ Только спикер/админ.")
+    admin = "\nспикер:ID — кому адресован" if scope is None else ""
+    bot.send_message(message.chat.id, SEARCH_HELP.format(admin=admin))
+    conversations.expect(message.chat.id, search_questions_step)
+
+@bot.message_handler(commands=["search"])
+@timed
+def search_command(message):
+    if search_scope(message.from_user.id) is False:
+        return bot.send_message(message.chat.id, "⛔ Только спикер/админ.")
+    query = message.text.partition(" ")[2].strip()
+    if not query:
+        return search_questions_start(message)
+    run_search(message, query)
+
+@conversations.step
+def search_questions_step(message):
+    if is_back(message.text):
+        return send_main_menu(message.chat.id, message.from_user.id)
+    run_search(message, message.text or "")
+
+@router.callback("qs_")
+def search_page(call):
+    _, direction, cursor = call.data.split("_", 2)
+    text, kb = build_search_page(call.message.chat.id, **{"after" if direction == "a" else "before": int(cursor)})
+    if kb is None:
+        return bot.answer_callback_query(call.id, text)
+    bot.edit_message_text(text, chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
 
 # --------------------- ADMIN PANEL (helpers) ---------------------
 
+@markups.static("admin_panel")
 def build_admin_panel_kb():
     kb = types.InlineKeyboardMarkup()
     kb.add(types.InlineKeyboardButton("Пользователи", callback_data="admin_users"))
@@ -339,82 +717,130 @@ def build_admin_panel_kb():
 
 def open_admin_panel_message(chat_id):
     """Отправить новую админ-панель сообщением (для message handlers)."""
-    kb = build_admin_panel_kb()
+    kb = markups.get("admin_panel")
     bot.send_message(chat_id, "🔧 Админ-панель:", reply_markup=kb)
 
 def edit_admin_panel_inplace(call):
     """Редактировать текущее сообщение callback'а под админ-панель."""
-    kb = build_admin_panel_kb()
+    kb = markups.get("admin_panel")
     try:
         bot.edit_message_text("🔧 Админ-панель:", chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
     except Exception:
 
         open_admin_panel_message(call.message.chat.id)
 
+# --------------------- ADMIN LISTS (paged) ---------------------
+
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "10"))
+
+# kind -> (заголовок, (текст кнопки, callback_data) для элемента, поле-курсор)
+ADMIN_LISTS = {
+    "users": ("Пользователи:", lambda u: (f"{u['uid']} ({u['role']})", f"user_{u['uid']}"), "uid"),
+    "speakers": ("Спикеры:", lambda s: (f"{s['name']} ({s['uid']})", f"speaker_{s['uid']}"), "uid"),
+    "events": ("Мероприятия:", lambda e: (f"{e['id']}. {e['title']}", f"event_{e['id']}"), "id"),
+    "questions": ("Вопросы:", lambda q: (f"{'✅' if q.get('answer') else '❓'} Q#{q['id']}", f"q_{q['id']}"), "id"),
+}
+
+def build_admin_list(kind, after=None, before=None, start=None):
+    """Одна страница списка админки: рендерится только видимый срез."""
+    title, button, key = ADMIN_LISTS[kind]
+    items, has_prev, has_next = store.page(kind, after=after, before=before, start=start, limit=ADMIN_PAGE_SIZE)
+    if not items and has_prev:
+        # Удалили последний элемент списка — показываем предыдущую страницу.
+        items, has_prev, has_next = store.page(kind, before=start if start is not None else after,
+                                               limit=ADMIN_PAGE_SIZE)
+    kb = types.InlineKeyboardMarkup()
+    for item in items:
+        text, data = button(item)
+        kb.add(types.InlineKeyboardButton(text, callback_data=data))
+    nav = []
+    if has_prev:
+        nav.append(types.InlineKeyboardButton("◀️", callback_data=f"pg_{kind}_b_{items[0][key]}"))
+    if has_next:
+        nav.append(types.InlineKeyboardButton("▶️", callback_data=f"pg_{kind}_a_{items[-1][key]}"))
+    if nav:
+        kb.row(*nav)
+    kb.add(types.InlineKeyboardButton("🔎 Перейти к ID", callback_data=f"find_{kind}"))
+    kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
+    return (title if items else f"{title}\n\nПусто."), kb
+
+def edit_admin_list(call, kind, **cursor):
+    text, kb = build_admin_list(kind, **cursor)
+    return bot.edit_message_text(text, chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
+
+@router.callback("pg_")
+def admin_list_page(call):
+    if call.from_user.id != ADMIN_ID:
+        return bot.answer_callback_query(call.id, "Нет прав.")
+    _, kind, direction, cursor = call.data.split("_", 3)
+    if kind not in ADMIN_LISTS:
+        return bot.answer_callback_query(call.id, "Неизвестный список.")
+    edit_admin_list(call, kind, **{"after" if direction == "a" else "before": cursor})
+
+@router.callback("find_")
+def admin_find_start(call):
+    if call.from_user.id != ADMIN_ID:
+        return bot.answer_callback_query(call.id, "Нет прав.")
+    kind = call.data.split("_", 1)[1]
+    bot.answer_callback_query(call.id)
+    bot.send_message(call.message.chat.id, "Введите ID (или 🔙 Назад):")
+    conversations.expect(call.message.chat.id, admin_find, kind)
+
+@conversations.step
+def admin_find(message, kind):
+    if is_back(message.text):
+        return open_admin_panel_message(message.chat.id)
+    cursor = (message.text or "").strip()
+    if ADMIN_LISTS[kind][2] == "id" and not cursor.isdigit():
+        bot.send_message(message.chat.id, "ID должен быть числом. Попробуйте снова или нажмите 🔙 Назад.")
+        return conversations.expect(message.chat.id, admin_find, kind)
+    text, kb = build_admin_list(kind, start=cursor)
+    bot.send_message(message.chat.id, text, reply_markup=kb)
+
 # --------------------- ADMIN PANEL (entry) ---------------------
 
-@bot.message_handler(func=lambda m: m.text == "🔧 Админ-панель")
+@router.text("🔧 Админ-панель")
 def admin_panel_open(message):
     if message.from_user.id != ADMIN_ID:
         return bot.send_message(message.chat.id, "⛔ У вас нет прав.")
     open_admin_panel_message(message.chat.id)
 
+@bot.message_handler(commands=["stats"])
+@timed
+def admin_stats(message):
+    if message.from_user.id != ADMIN_ID:
+        return bot.send_message(message.chat.id, "⛔ У вас нет прав.")
+    st = names.stats()
+    bot.send_message(message.chat.id, f"👤 Кэш имён: {st['size']} записей\n"
+                                      f"Попаданий: {st['hits']} (+{st['negative_hits']} отрицательных)\n"
+                                      f"Промахов (get_chat): {st['misses']}\nДоля попаданий: {st['hit_ratio']:.0%}")
+
 # --------------------- ADMIN CALLBACKS ---------------------
 
-@bot.callback_query_handler(func=lambda c: c.data.startswith("admin_") and c.data != "admin_back")
+@router.callback("admin_")
 def admin_menu(call):
     if call.from_user.id != ADMIN_ID:
         return bot.answer_callback_query(call.id, "Нет прав.")
     action = call.data.split("_", 1)[1]
 
-    # USERS
-    if action == "users":
-        kb = types.InlineKeyboardMarkup()
-
-        for uid, role in db.get("roles", {}).items():
-            kb.add(types.InlineKeyboardButton(f"{uid} ({role})", callback_data=f"user_{uid}"))
-        kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
-        return bot.edit_message_text("Пользователи:", chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
-
-    # SPEAKERS
-    if action == "speakers":
-        kb = types.InlineKeyboardMarkup()
-        for uid, name in db.get("speakers", {}).items():
-            kb.add(types.InlineKeyboardButton(f"{name} ({uid})", callback_data=f"speaker_{uid}"))
-        kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
-        return bot.edit_message_text("Спикеры:", chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
-
-    # EVENTS
-    if action == "events":
-        kb = types.InlineKeyboardMarkup()
-        for i, e in enumerate(db.get("events", [])):
-            kb.add(types.InlineKeyboardButton(f"{i+1}. {e['title']}", callback_data=f"event_{i}"))
-        kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
-        return bot.edit_message_text("Мероприятия:", chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
-
-    # QUESTIONS
-    if action == "questions":
-        kb = types.InlineKeyboardMarkup()
-        for i, q in enumerate(db.get("questions", [])):
-            kb.add(types.InlineKeyboardButton(f"{'✅' if q.get('answer') else '❓'} Q#{i+1}", callback_data=f"q_{i}"))
-        kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
-        return bot.edit_message_text("Вопросы:", chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
+    if action in ADMIN_LISTS:
+        return edit_admin_list(call, action)
 
     # BROADCAST MESSAGE
     if action == "broadcast":
         bot.answer_callback_query(call.id)
         bot.send_message(call.message.chat.id, "Введите текст рассылки:")
-        bot.register_next_step_handler(call.message, send_broadcast_message)
+        conversations.expect(call.message.chat.id, send_broadcast_message)
         return
 
-@bot.callback_query_handler(func=lambda c: c.data == "admin_back")
+@router.callback("admin_back")
 def admin_back(call):
 
     edit_admin_panel_inplace(call)
 
 # --------------------- ADMIN ACTIONS (users/speakers/events/questions) ---------------------
 
-@bot.callback_query_handler(func=lambda c: any(c.data.startswith(x) for x in ("user_", "speaker_", "event_", "q_")))
+@router.callback("user_", "speaker_", "event_", "q_")
 def admin_actions(call):
     if call.from_user.id != ADMIN_ID:
         return bot.answer_callback_query(call.id, "Нет прав.")
@@ -432,26 +858,14 @@ def admin_actions(call):
     if data.startswith("user_to_user_"):
         uid = data.split("_", 3)[3]
         set_role(uid, "user")
-        save_db()
         bot.answer_callback_query(call.id, "Роль изменена")
-
-
-        kb = types.InlineKeyboardMarkup()
-        for u, role in db.get("roles", {}).items():
-            kb.add(types.InlineKeyboardButton(f"{u} ({role})", callback_data=f"user_{u}"))
-        kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
-        return bot.edit_message_text("Пользователи:", chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
-
+        return edit_admin_list(call, "users", start=uid)
 
     if data.startswith("user_delete_"):
         uid = data.split("_", 2)[2]
         remove_user(uid)
         bot.answer_callback_query(call.id, "Пользователь удалён")
-        kb = types.InlineKeyboardMarkup()
-        for u, role in db.get("roles", {}).items():
-            kb.add(types.InlineKeyboardButton(f"{u} ({role})", callback_data=f"user_{u}"))
-        kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
-        return bot.edit_message_text("Пользователи:", chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
+        return edit_admin_list(call, "users", start=uid)
 
     # ---------- SPEAKERS ----------
     if data.startswith("speaker_") and not data.startswith("speaker_delete_"):
@@ -459,110 +873,186 @@ def admin_actions(call):
         kb = types.InlineKeyboardMarkup()
         kb.add(types.InlineKeyboardButton("Удалить спикера", callback_data=f"speaker_delete_{uid}"))
         kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_speakers"))
-        return bot.edit_message_text(f"Спикер {uid}\nИмя: {db.get('speakers', {}).get(uid, '-')}", chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
+        return bot.edit_message_text(f"Спикер {uid}\nИмя: {store.speaker_name(uid) or '-'}", chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
 
     if data.startswith("speaker_delete_"):
         uid = data.split("_", 2)[2]
-        db.get("speakers", {}).pop(uid, None)
-        db.get("roles", {}).pop(uid, None) 
-        save_db()
+        store.remove_speaker(uid)
+        store.delete_role(uid)
         bot.answer_callback_query(call.id, "Спикер удалён")
-
-        kb = types.InlineKeyboardMarkup()
-        for u, name in db.get("speakers", {}).items():
-            kb.add(types.InlineKeyboardButton(f"{name} ({u})", callback_data=f"speaker_{u}"))
-        kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
-        return bot.edit_message_text("Спикеры:", chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
-
+        return edit_admin_list(call, "speakers", start=uid)
 
     # ---------- EVENTS ----------
     if data.startswith("event_") and not data.startswith("event_delete_"):
         try:
-            idx = int(data.split("_", 1)[1])
+            event_id = int(data.split("_", 1)[1])
         except Exception:
-            return bot.answer_callback_query(call.id, "Неверный индекс.")
-        events = db.get("events", [])
-        if idx < 0 or idx >= len(events):
-            return bot.answer_callback_query(call.id, "Индекс вне диапазона.")
-        e = events[idx]
+            return bot.answer_callback_query(call.id, "Неверный ID.")
+        e = store.get_event(event_id)
+        if e is None:
+            return bot.answer_callback_query(call.id, "Мероприятие не найдено.")
         kb = types.InlineKeyboardMarkup()
-        kb.add(types.InlineKeyboardButton("Удалить мероприятие", callback_data=f"event_delete_{idx}"))
+        kb.add(types.InlineKeyboardButton("Удалить мероприятие", callback_data=f"event_delete_{event_id}"))
         kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_events"))
-        txt = f"Мероприятие {idx+1}:\n{e['title']}\n\n{e['description']}\nСпикер: {e.get('speaker_name')}"
+        txt = f"Мероприятие {event_id}:\n{e['title']}\n\n{e['description']}\nСпикер: {e.get('speaker_name')}"
         return bot.edit_message_text(txt, chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
 
     if data.startswith("event_delete_"):
         try:
-            idx = int(data.split("_", 2)[2])
+            event_id = int(data.split("_", 2)[2])
         except Exception:
-            return bot.answer_callback_query(call.id, "Неверный индекс.")
-        events = db.get("events", [])
-        if 0 <= idx < len(events):
-            ev = events.pop(idx)
-            save_db()
-            notify_all(f"Мероприятие удалено:\n\n❌ *{ev['title']}*")
-            bot.answer_callback_query(call.id, f"Мероприятие удалено: {ev['title']}")
-            kb = types.InlineKeyboardMarkup()
-            for i, e in enumerate(events):
-                kb.add(types.InlineKeyboardButton(f"{i+1}. {e['title']}", callback_data=f"event_{i}"))
-            kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_events"))
-            return bot.edit_message_text("Мероприятия:", chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
-        else:
-            return bot.answer_callback_query(call.id, "Индекс вне диапазона.")
+            return bot.answer_callback_query(call.id, "Неверный ID.")
+        ev = store.delete_event(event_id)
+        if ev is None:
+            return bot.answer_callback_query(call.id, "Мероприятие не найдено.")
+        outbox.event_deleted(event_id, f"❌ Мероприятие удалено: *{event_md.get(event_id, ev)['title']}*",
+                             exclude=call.from_user.id)
+        event_md.discard(event_id)
+        bot.answer_callback_query(call.id, f"Мероприятие удалено: {ev['title']}")
+        return edit_admin_list(call, "events", start=event_id)
 
     # ---------- QUESTIONS ----------
     if data.startswith("q_") and not data.startswith("q_delete_"):
         try:
-            idx = int(data.split("_", 1)[1])
+            qid = int(data.split("_", 1)[1])
         except Exception:
-            return bot.answer_callback_query(call.id, "Неверный индекс.")
-        qs = db.get("questions", [])
-        if idx < 0 or idx >= len(qs):
-            return bot.answer_callback_query(call.id, "Индекс вне диапазона.")
-        q = qs[idx]
+            return bot.answer_callback_query(call.id, "Неверный ID.")
+        q = store.get_question(qid)
+        if q is None:
+            return bot.answer_callback_query(call.id, "Вопрос не найден.")
         kb = types.InlineKeyboardMarkup()
-        kb.add(types.InlineKeyboardButton("Удалить вопрос", callback_data=f"q_delete_{idx}"))
+        kb.add(types.InlineKeyboardButton("Удалить вопрос", callback_data=f"q_delete_{qid}"))
         kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_questions"))
-        txt = (f"Вопрос #{idx+1}\nОт: {safe_username(q['from'])}\nКому: {safe_username(q['to'])}\n\n"
+        txt = (f"Вопрос #{qid}\nОт: {safe_username(q['from'])}\nКому: {safe_username(q['to'])}\n\n"
                f"❓ {q['question']}\n💬 Ответ: {q.get('answer') or 'Нет'}")
         return bot.edit_message_text(txt, chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb)
 
     if data.startswith("q_delete_"):
         qid = int(data.split("_", 2)[2])
 
-        questions = db.get("questions", [])
-        if 0 <= qid < len(questions):
-            removed = questions.pop(qid)
-            save_db()
+        if store.delete_question(qid):
+            answer_md.discard(qid)
             bot.answer_callback_query(call.id, "Вопрос удалён")
         else:
-            bot.answer_callback_query(call.id, "Индекс вне диапазона")
+            bot.answer_callback_query(call.id, "Вопрос не найден")
+        return edit_admin_list(call, "questions", start=qid)
 
-        questions = db.get("questions", [])
-        kb = types.InlineKeyboardMarkup()
+# --------------------- RUN ---------------------
 
-        if questions:
-            for idx, q in enumerate(questions):
-                text = q.get("text", "Без текста")
-                sender = q.get("from")
-                kb.add(types.InlineKeyboardButton(
-                    f"{idx+1}. {text[:30]}... от {sender}",
-                    callback_data=f"question_{idx}"
-                ))
-        else:
-            kb.add(types.InlineKeyboardButton("Нет вопросов", callback_data="none"))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+
+def run_webhook():
+    server = WebhookServer(bot, (WEBHOOK_LISTEN, WEBHOOK_PORT), path=WEBHOOK_PATH, secret=WEBHOOK_SECRET,
+                           workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE)
+    metrics.UPDATE_BACKLOG.set_function(server.workers.backlog)
+    if WEBHOOK_URL:
+        bot.remove_webhook()
+        bot.set_webhook(url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+    print(f"Webhook listening on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        server.serve_forever()
+    finally:
+        server.stop()
 
-        kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
 
-        return bot.edit_message_text(
-            "Вопросы:",
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=kb
-        )
+ASYNC_MAX_IN_FLIGHT = int(os.getenv("ASYNC_MAX_IN_FLIGHT", "100"))
+
+
+def run_async():
+    import asyncio
+    from aioengine import AsyncEngine
+
+    engine = AsyncEngine(bot, TOKEN, max_in_flight=ASYNC_MAX_IN_FLIGHT)
+    metrics.UPDATE_BACKLOG.set_function(engine.backlog)
+    print(f"Async engine started (max in flight: {ASYNC_MAX_IN_FLIGHT})")
+    asyncio.run(engine.run())
+
+
+CLUSTER_LEASE_TTL = int(os.getenv("CLUSTER_LEASE_TTL", "15"))
+
+
+def run_worker(index, updates):
+    """Процесс кластера (cluster.py): апдейты своих чатов из `updates`; рассылки — только у лидера."""
+    bot.threaded = False
+    broadcaster.active = False
+    workers = UpdateWorkers(raw_handler(bot), WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE)
+    metrics.UPDATE_BACKLOG.set_function(lambda: workers.backlog() + updates.qsize())
+    if METRICS_PORT:
+        metrics.MetricsServer((METRICS_HOST, METRICS_PORT)).start()
+
+    def on_leader(leading):
+        broadcaster.active = leading
+        print(f"worker {index}: {'leader' if leading else 'follower'}")
+
+    leader = Leader(store, ttl=CLUSTER_LEASE_TTL, duties=[broadcaster.resume_all, outbox.flush],
+                    on_change=on_leader).start()
+    print(f"worker {index} started (pid {os.getpid()})")
+    try:
+        for data in iter(updates.get, None):
+            workers.put(data, raw_chat_id(data), block=True)
+    finally:
+        workers.stop()
+        leader.stop()
+        broadcaster.shutdown()
+        names.save()
+        store.close()
+
+
+def shutdown(signum, frame):
+    bot.stop_polling()
+    sys.exit(0)
+
+
+def migrate():
+    """Разовый перенос DB_PATH (JSON) в SQLITE_PATH."""
+    if STORAGE_BACKEND == "sqlite":
+        source, target = JsonStorage(DB_PATH, flush_mode="on-shutdown"), store
+    else:
+        source, target = store, SqliteStorage(SQLITE_PATH)
+    try:
+        counts = migrate_json_to_sqlite(source, target)
+    finally:
+        source.close()
+        target.close()
+    print("Migrated:", ", ".join(f"{k}={v}" for k, v in counts.items()))
 
-# --------------------- RUN ---------------------
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--migrate", action="store_true", help="перенести DB_PATH в SQLITE_PATH и выйти")
+    parser.add_argument("--mode", choices=("polling", "webhook", "async"), default=os.getenv("BOT_MODE", "polling"))
+    args = parser.parse_args()
+    if args.migrate:
+        migrate()
+        sys.exit(0)
+    if args.mode == "webhook" and not WEBHOOK_SECRET:
+        sys.exit("webhook: задайте WEBHOOK_SECRET — без него апдейт от имени админа может прислать кто угодно")
+    signal.signal(signal.SIGTERM, shutdown)
+    if METRICS_PORT:
+        metrics.MetricsServer((METRICS_HOST, METRICS_PORT)).start()
+        print(f"Metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    broadcaster.resume_all()
+    outbox.start()
     print("Bot started...")
-    bot.polling(none_stop=True)
+    try:
+        if args.mode == "webhook":
+            run_webhook()
+        elif args.mode == "async":
+            run_async()
+        else:
+            bot.polling(none_stop=True)
+    finally:
+        outbox.stop()
+        broadcaster.shutdown()
+        names.save()
+        store.close()
@@ -0,0 +1,97 @@
+import threading
+from bisect import bisect_right
+from datetime import datetime
+from itertools import takewhile
+
+
+def parse_time(text, base=None):
+    """'2025-11-26 10:00' / ISO-строка -> datetime; 'ЧЧ:ММ' — в день `base`."""
+    text = text.strip()
+    if base is not None and len(text) <= 5:
+        t = datetime.strptime(text, "%H:%M")
+        return base.replace(hour=t.hour, minute=t.minute, second=0, microsecond=0)
+    return datetime.fromisoformat(text)
+
+
+def to_ts(iso):
+    return datetime.fromisoformat(iso).timestamp()
+
+
+class ScheduleIndex:
+    """Доклады, отсортированные по началу, для быстрых запросов «кто сейчас» и «что дальше».
+
+    «Что дальше» — бинарный поиск по ключам (start, talk_id). «Кто сейчас» —
+    статическое центрированное дерево интервалов: в узле лежат доклады,
+    накрывающие его центр, слева — закончившиеся до центра, справа —
+    начавшиеся после. Запрос спускается по одной ветви глубиной O(log n)
+    и в каждом узле смотрит только на реально идущие доклады, так что один
+    длинный доклад не заставляет перебирать всё расписание.
+
+    `version` — версия расписания в хранилище, из которой собран индекс:
+    по ней видно, что доклады изменил другой процесс и индекс пора пересобрать.
+    """
+
+    def __init__(self, talks=(), version=None):
+        self.lock = threading.Lock()
+        self.reload(talks, version)
+
+    def reload(self, talks, version=None):
+        talks = [dict(t, _start=to_ts(t["start_time"]), _end=to_ts(t["end_time"])) for t in talks]
+        # Доклад, который кончается не позже начала (старые данные, импорт), никогда не идёт,
+        # а дерево на нём не строится.
+        broken = [t["talk_id"] for t in talks if t["_end"] <= t["_start"]]
+        if broken:
+            print(f"schedule: пропущены доклады с окончанием не позже начала: {broken}")
+            talks = [t for t in talks if t["_end"] > t["_start"]]
+        tree = self._build(talks)
+        keys = sorted((t["_start"], t["talk_id"]) for t in talks)
+        with self.lock:
+            self.version = version
+            self._talks = {t["talk_id"]: t for t in talks}
+            self._keys = keys
+            self._tree = tree
+
+    @classmethod
+    def _build(cls, talks):
+        """Узел: (центр, накрывающие центр по началу, они же по убыванию конца, левое, правое)."""
+        if not talks:
+            return None
+        # Центр — медиана начал: в каждое поддерево уходит не больше половины докладов.
+        center = sorted(t["_start"] for t in talks)[len(talks) // 2]
+        left = [t for t in talks if t["_end"] <= center]
+        right = [t for t in talks if t["_start"] > center]
+        here = [t for t in talks if t["_start"] <= center < t["_end"]]
+        if not here and len(talks) in (len(left), len(right)):
+            # Деление ничего не дало — так бывает только с вырожденными интервалами.
+            return None
+        return (center,
+                sorted(here, key=lambda t: t["_start"]),
+                sorted(here, key=lambda t: t["_end"], reverse=True),
+                cls._build(left), cls._build(right))
+
+    @staticmethod
+    def _public(talk):
+        return {k: v for k, v in talk.items() if not k.startswith("_")}
+
+    def current(self, now):
+        """Доклады, идущие в момент `now` (секунды epoch), по времени начала."""
+        with self.lock:
+            node, live = self._tree, []
+            while node is not None:
+                center, by_start, by_end, left, right = node
+                if now < center:
+                    # Все доклады узла идут дольше `now` — отбираем уже начавшиеся.
+                    live.extend(takewhile(lambda t: t["_start"] <= now, by_start))
+                    node = left
+                else:
+                    # Все доклады узла уже начались — отбираем ещё не закончившиеся.
+                    live.extend(takewhile(lambda t: t["_end"] > now, by_end))
+                    node = right
+            live.sort(key=lambda t: (t["_start"], t["talk_id"]))
+            return [self._public(t) for t in live]
+
+    def upcoming(self, now, n=5):
+        """Ближайшие `n` докладов, которые начнутся после `now`."""
+        with self.lock:
+            i = bisect_right(self._keys, (now, float("inf")))
+            return [self._public(self._talks[tid]) for _, tid in self._keys[i:i + n]]
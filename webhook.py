@@ -0,0 +1,188 @@
+import argparse
+import hmac
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+
+def update_chat_id(update):
+    """Чат, к которому относится апдейт: по нему апдейты раскладываются по очередям."""
+    for msg in (update.message, update.edited_message):
+        if msg is not None:
+            return msg.chat.id
+    call = update.callback_query
+    if call is not None:
+        return call.message.chat.id if call.message else call.from_user.id
+    return 0
+
+
+def raw_chat_id(data):
+    """То же для апдейта в виде dict из JSON (до разбора в types.Update)."""
+    for key in ("message", "edited_message"):
+        if data.get(key):
+            return data[key]["chat"]["id"]
+    call = data.get("callback_query")
+    if call:
+        return call["message"]["chat"]["id"] if call.get("message") else call["from"]["id"]
+    return 0
+
+
+def raw_handler(bot):
+    """Обработчик сырых апдейтов для UpdateWorkers: разбор JSON — уже в потоке очереди."""
+    return lambda data: bot.process_new_updates([types.Update.de_json(data)])
+
+
+class UpdateWorkers:
+    """Ограниченные очереди апдейтов с пулом обработчиков.
+
+    Апдейты одного чата всегда попадают в одну очередь, поэтому обрабатываются
+    строго по порядку (важно для шагов диалогов). Если очередь
+    переполнена, put() возвращает False — вызывающий отвечает отказом, и
+    Telegram повторит доставку позже.
+    """
+
+    def __init__(self, handle, workers=4, queue_size=1000):
+        self.handle = handle
+        self.queues = [queue.Queue(maxsize=max(1, queue_size // workers)) for _ in range(workers)]
+        self.threads = [threading.Thread(target=self._run, args=(q,), name=f"update-worker-{i}", daemon=True)
+                        for i, q in enumerate(self.queues)]
+        for t in self.threads:
+            t.start()
+
+    def put(self, update, chat_id, block=False):
+        try:
+            self.queues[hash(chat_id) % len(self.queues)].put(update, block=block)
+            return True
+        except queue.Full:
+            return False
+
+    def backlog(self):
+        return sum(q.qsize() for q in self.queues)
+
+    def _run(self, q):
+        while True:
+            update = q.get()
+            if update is None:
+                return
+            try:
+                self.handle(update)
+            except Exception as e:
+                print(f"update {update.get('update_id')} failed: {e!r}")
+
+    def stop(self, timeout=10):
+        for q in self.queues:
+            q.put(None)
+        deadline = time.monotonic() + timeout
+        for t in self.threads:
+            t.join(max(0, deadline - time.monotonic()))
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """HTTP-эндпоинт для апдейтов Telegram: проверка секрета, быстрый 200, обработка в очереди.
+
+    Секрет обязателен: без него любой, кто достучится до порта, пришлёт
+    апдейт от имени админа.
+
+    Вместо своих очередей можно передать `pool` с тем же put(update, chat_id)
+    (например, процессы кластера) — тогда `bot` не нужен.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, bot, address, path="/webhook", secret=None, workers=4, queue_size=1000, pool=None):
+        if not secret:
+            raise ValueError("WebhookServer: нужен secret (WEBHOOK_SECRET)")
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        if pool is None:
+            # Порядок внутри чата обеспечивают очереди, поэтому обработчики
+            # вызываются синхронно в потоке очереди.
+            bot.threaded = False
+            pool = UpdateWorkers(raw_handler(bot), workers, queue_size)
+        self.workers = pool
+        super().__init__(address, WebhookRequestHandler)
+
+    def stop(self):
+        self.server_close()
+        self.workers.stop()
+
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        srv = self.server
+        if self.path != srv.path:
+            return self._reply(404)
+        token = self.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token, srv.secret):
+            return self._reply(403)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            update = json.loads(body)
+            chat_id = raw_chat_id(update)
+        except Exception:
+            return self._reply(400)
+        if not srv.workers.put(update, chat_id):
+            return self._reply(503, {"Retry-After": "1"})
+        self._reply(200)
+
+    def _reply(self, status, headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+# --------------------- FAKE UPDATES ---------------------
+
+_fake_ids = iter(range(int(time.time()), 1 << 62))
+
+
+def fake_update(chat_id, text=None, callback_data=None):
+    """Синтетический апдейт в формате Bot API (сообщение или нажатие кнопки)."""
+    user = {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"}
+    chat = {"id": chat_id, "type": "private"}
+    uid = next(_fake_ids)
+    if callback_data is not None:
+        return {"update_id": uid, "callback_query": {
+            "id": str(uid), "chat_instance": str(chat_id), "from": user, "data": callback_data,
+            "message": {"message_id": 1, "date": int(time.time()), "chat": chat, "text": "..."}}}
+    msg = {"message_id": uid, "date": int(time.time()), "chat": chat, "from": user, "text": text}
+    if text and text.startswith("/"):
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": uid, "message": msg}
+
+
+def post_update(url, update, secret=None):
+    req = urllib.request.Request(url, data=json.dumps(update).encode("utf-8"), method="POST",
+                                 headers={"Content-Type": "application/json"})
+    if secret:
+        req.add_header("X-Telegram-Bot-Api-Secret-Token", secret)
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отправить фейковый апдейт в локальный вебхук бота.")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/webhook")
+    parser.add_argument("--secret")
+    parser.add_argument("--chat", type=int, default=1)
+    parser.add_argument("--text")
+    parser.add_argument("--callback")
+    parser.add_argument("--count", type=int, default=1)
+    args = parser.parse_args()
+    for _ in range(args.count):
+        print(post_update(args.url, fake_update(args.chat, args.text, args.callback), args.secret))